@@ -0,0 +1,104 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import gzip
+import io
+import sys
+from functools import partial
+
+import plac
+
+from .corpus import lemmatize_lines
+from .lemmatizer import create_lemmatizer
+from .parallel import ParallelLemmatizer
+
+
+def open_input(path):
+    """Open a text file for reading. Files ending in .gz, and gzipped data
+    on stdin, are decompressed.
+
+    path (unicode): Path of the file or "-" for stdin.
+    RETURNS (file): The file in text mode.
+    """
+    if path == "-":
+        stdin = sys.stdin.buffer
+        if stdin.peek(2)[:2] == b"\x1f\x8b":
+            return gzip.open(stdin, "rt", encoding="utf-8")
+        return io.TextIOWrapper(stdin, encoding="utf-8")
+    elif path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    else:
+        return io.open(path, encoding="utf-8")
+
+
+def open_output(path):
+    """Open a text file for writing. Files ending in .gz are compressed.
+
+    path (unicode): Path of the file or "-" for stdout.
+    RETURNS (file): The file in text mode.
+    """
+    if path == "-":
+        return io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+    elif path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+    else:
+        return io.open(path, "w", encoding="utf-8")
+
+
+def iter_chunks(lines, chunk_size):
+    """Split lines into chunks of whole sentences.
+
+    lines (iterable): Lines with their terminators.
+    chunk_size (int): Number of lines after which a chunk ends at the next
+        empty line. A chunk without empty lines ends at twice this size.
+    YIELDS (list): The lines of each chunk without terminators.
+    """
+    chunk = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        chunk.append(line)
+        if len(chunk) >= chunk_size and (not line or len(chunk) >= 2 * chunk_size):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_input_lines(paths):
+    for path in paths:
+        with open_input(path) as f:
+            for line in f:
+                yield line
+
+
+@plac.annotations(
+    inputs=('CoNLL-U or TSV files, optionally gzipped. Reads stdin if none '
+            'are given', 'positional', None, str),
+    output=('Output file. Compressed if it ends in .gz', 'option', 'o', str),
+    fmt=('Input format: conllu or tsv (form, UPOS)', 'option', 'f', str,
+         ['conllu', 'tsv']),
+    n_process=('Number of worker processes', 'option', 'n', int),
+    chunk_size=('Number of lines sent to a worker at a time', 'option', 'c', int),
+    max_in_flight=('Maximum number of chunks being processed', 'option', 'm', int),
+)
+def main(output="-", fmt="conllu", n_process=1, chunk_size=10000,
+         max_in_flight=None, *inputs):
+    """Fill in the lemmas of CoNLL-U or token-per-line TSV files.
+
+    python -m fi -n 8 -o lemmatized.conllu.gz corpus.conllu.gz
+    """
+    chunks = iter_chunks(iter_input_lines(inputs or ["-"]), chunk_size)
+    process = partial(lemmatize_lines, fmt=fmt)
+    with open_output(output) as out:
+        if n_process > 1:
+            with ParallelLemmatizer(n_process, max_in_flight=max_in_flight) as pool:
+                for text in pool.map_chunks(process, chunks):
+                    out.write(text)
+        else:
+            lemmatizer = create_lemmatizer()
+            for chunk in chunks:
+                out.write(process(lemmatizer, chunk))
+
+
+if __name__ == "__main__":
+    plac.call(main)
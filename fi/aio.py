@@ -0,0 +1,115 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import asyncio
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .lemmatizer import create_lemmatizer
+
+
+class AsyncLemmatizer(object):
+    """asyncio front end for FinnishLemmatizer.
+
+    Concurrent `alemmatize` calls are collected into micro-batches, which
+    are deduplicated and lemmatized on a thread pool, so the event loop is
+    never blocked by Voikko. Every thread has a Voikko handle of its own.
+    """
+
+    def __init__(self, lemmatizer=None, n_threads=None, max_batch_size=256,
+                 max_delay=0.002, max_pending=10000):
+        """Initialize the lemmatizer.
+
+        lemmatizer (FinnishLemmatizer): The lemmatizer to use. By default one
+            is created with a Voikko handle for each thread.
+        n_threads (int): Number of worker threads. Defaults to the number of
+            CPUs.
+        max_batch_size (int): A batch is sent as soon as it has this many
+            requests.
+        max_delay (float): Seconds a request waits for more requests to join
+            its batch.
+        max_pending (int): Maximum number of unfinished requests. Further
+            calls wait until earlier ones finish.
+        RETURNS (AsyncLemmatizer): The newly constructed object.
+        """
+        if n_threads is None:
+            n_threads = os.cpu_count() or 1
+        if lemmatizer is None:
+            lemmatizer = create_lemmatizer(voikko_pool_size=n_threads)
+        self.lemmatizer = lemmatizer
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(n_threads)
+        self._batch = []
+        self._timer = None
+        self._slots = None
+        self._closed = False
+
+    async def alemmatize(self, string, univ_pos):
+        """Lemmatize a string.
+
+        string (unicode): The string to lemmatize, e.g. the token text.
+        univ_pos (unicode / int): The token's universal part-of-speech tag.
+        RETURNS (tuple): The available lemmas for the string.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncLemmatizer is closed")
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._batch.append(((string, univ_pos), future))
+            if len(self._batch) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_delay, self._flush)
+            return await future
+
+    async def close(self):
+        """Finish the queued requests and stop the worker threads."""
+        self._closed = True
+        self._flush()
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._executor.shutdown)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Requests whose caller has been cancelled are dropped
+        batch = [(key, future) for key, future in self._batch
+                 if not future.done()]
+        self._batch = []
+        if not batch:
+            return
+
+        keys = list(OrderedDict.fromkeys(key for key, _ in batch))
+        try:
+            task = asyncio.get_running_loop().run_in_executor(
+                self._executor, self.lemmatizer.lemmatize_many, keys)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        task.add_done_callback(lambda t: self._resolve(t, keys, batch))
+
+    def _resolve(self, task, keys, batch):
+        if task.cancelled():
+            for _, future in batch:
+                future.cancel()
+            return
+        error = task.exception()
+        if error is not None:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        lemmas = dict(zip(keys, task.result()))
+        for key, future in batch:
+            if not future.done():
+                future.set_result(lemmas[key])
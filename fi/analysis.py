@@ -0,0 +1,197 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import re
+import sys
+
+
+class FstRecord(object):
+    """The parts of a Voikko analysis' FSTOUTPUT and WORDBASES that the
+    lemmatizer uses, parsed once.
+
+    FSTOUTPUT is a sequence of tags in brackets and text, for example
+    "[Lt][Xp]ajaa[X]aja[Tn4]mi[Ny]nen[Sn][Ny]". It is split into tokens in
+    one pass, and the stems that precede the tags are recorded.
+    """
+
+    __slots__ = ("ny_stem", "compounds", "first_wordbase", "tag_stems")
+
+    fst_token_re = re.compile(r"\[([^\]]*)\]|([^\[]+)")
+    word_start_re = re.compile(r"\w+")
+    word_end_re = re.compile(r"\w+$")
+    tag_name_re = re.compile(r"\w+$")
+    compound_re = re.compile(r"\+(\w+)(?:\(\+?[\w=]+\))?")
+    wordbase_re = re.compile(r"\((\w+)\)")
+
+    def __init__(self, fstoutput, wordbases):
+        """Parse an analysis.
+
+        fstoutput (unicode): The FSTOUTPUT of the analysis.
+        wordbases (unicode): The WORDBASES of the analysis.
+        RETURNS (FstRecord): The newly constructed object.
+        """
+        # Tags are stored as (name, None) and text as (None, text)
+        tokens = [m.groups() for m in self.fst_token_re.finditer(fstoutput)]
+
+        self.ny_stem = None
+        # (tag, stem before the tag, text after the tag) for the tags that
+        # directly follow a word
+        self.tag_stems = []
+        for i, (tag, _) in enumerate(tokens):
+            if tag is None:
+                continue
+
+            if (self.ny_stem is None and tag == "X" and i + 3 < len(tokens) and
+                tokens[i + 1][0] and self.tag_name_re.match(tokens[i + 1][0]) and
+                tokens[i + 2][0] == "Ny" and tokens[i + 3][1]
+            ):
+                m = self.word_start_re.match(tokens[i + 3][1])
+                if m:
+                    self.ny_stem = m.group()
+
+            if 0 < i < len(tokens) - 1 and tokens[i - 1][1] and tokens[i + 1][1]:
+                m = self.word_end_re.search(tokens[i - 1][1])
+                if m:
+                    self.tag_stems.append((tag, m.group(), tokens[i + 1][1]))
+
+        self.compounds = self.compound_re.findall(wordbases)
+        m = self.wordbase_re.search(wordbases)
+        self.first_wordbase = m.group(1) if m else None
+
+    def stem(self, tag, following):
+        """Find the stem of the first occurrence of a tag that is followed
+        by the given text, e.g. "ajaa" in "...ajaa[Tn4]mi...".
+
+        tag (unicode): The tag name without brackets, e.g. "Tn4".
+        following (unicode): The beginning of the text after the tag.
+        RETURNS (unicode): The stem or None.
+        """
+        for name, stem, text in self.tag_stems:
+            if name == tag and text.startswith(following):
+                return stem
+        return None
+
+    def to_list(self):
+        """RETURNS (list): The parsed values as plain lists and strings, e.g.
+            for msgpack. Restore the record with `FstRecord.from_list`.
+        """
+        return [self.ny_stem, self.compounds, self.first_wordbase,
+                [list(item) for item in self.tag_stems]]
+
+    @classmethod
+    def from_list(cls, values):
+        """Restore a record from `to_list`.
+
+        values (list): The values returned by `to_list`.
+        RETURNS (FstRecord): The record.
+        """
+        record = cls.__new__(cls)
+        record.ny_stem = values[0]
+        record.compounds = list(values[1])
+        record.first_wordbase = values[2]
+        record.tag_stems = [tuple(item) for item in values[3]]
+        return record
+
+    def nbytes(self):
+        """Estimate the memory used by the record.
+
+        RETURNS (int): The estimated size in bytes.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self.tag_stems) + \
+            sys.getsizeof(self.compounds)
+        for item in self.tag_stems:
+            size += sys.getsizeof(item) + sum(sys.getsizeof(x) for x in item)
+        for value in self.compounds + [self.ny_stem, self.first_wordbase]:
+            if value is not None:
+                size += sys.getsizeof(value)
+        return size
+
+
+class Analysis(object):
+    """The fields of a Voikko analysis that the lemmatizer uses, with its
+    FSTOUTPUT and WORDBASES parsed on first use. The parsed record replaces
+    the two strings, so cached analyses are parsed at most once and don't
+    keep both.
+
+    The other fields of the analysis are dropped, and the values of the tag
+    fields are interned, so that cached analyses share one copy of each tag.
+    """
+
+    field_names = (
+        "BASEFORM", "CLASS", "MOOD", "PARTICIPLE", "SIJAMUOTO", "FOCUS",
+        "KYSYMYSLIITE", "POSSESSIVE", "FSTOUTPUT", "WORDBASES",
+    )
+    interned_fields = frozenset((
+        "CLASS", "MOOD", "PARTICIPLE", "SIJAMUOTO", "FOCUS", "KYSYMYSLIITE",
+        "POSSESSIVE",
+    ))
+    field_indices = {name: i for i, name in enumerate(field_names)}
+    __slots__ = ("_values", "_fst")
+
+    def __init__(self, fields):
+        """Wrap an analysis.
+
+        fields (dict): The analysis returned by `libvoikko.Voikko.analyze`,
+            or the `fields` of an Analysis.
+        RETURNS (Analysis): The newly constructed object.
+        """
+        values = []
+        for name in self.field_names:
+            value = fields.get(name)
+            if value is not None and name in self.interned_fields:
+                value = sys.intern(value)
+            values.append(value)
+        self._values = tuple(values)
+        self._fst = None
+        if fields.get("FSTRECORD") is not None:
+            self._set_fst(FstRecord.from_list(fields["FSTRECORD"]))
+
+    def get(self, name, default=None):
+        try:
+            value = self._values[self.field_indices[name]]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    @property
+    def fields(self):
+        """RETURNS (dict): The kept fields of the analysis. Once FSTOUTPUT
+            and WORDBASES have been parsed, the record is under "FSTRECORD"
+            instead.
+        """
+        fields = {name: value for name, value in zip(self.field_names, self._values)
+                  if value is not None}
+        if self._fst is not None:
+            fields["FSTRECORD"] = self._fst.to_list()
+        return fields
+
+    @property
+    def fst(self):
+        """RETURNS (FstRecord): The parsed FSTOUTPUT and WORDBASES."""
+        if self._fst is None:
+            self._set_fst(FstRecord(self.get("FSTOUTPUT") or "",
+                                    self.get("WORDBASES") or ""))
+        return self._fst
+
+    def _set_fst(self, record):
+        # The strings are dropped, as only the record is used
+        values = list(self._values)
+        values[self.field_indices["FSTOUTPUT"]] = None
+        values[self.field_indices["WORDBASES"]] = None
+        self._values = tuple(values)
+        self._fst = record
+
+    def nbytes(self):
+        """Estimate the memory used by the analysis, including the parsed
+        FSTOUTPUT and WORDBASES. They are parsed now if they haven't been
+        yet, so the estimate stays constant while cached. Interned values
+        are shared and not counted.
+
+        RETURNS (int): The estimated size in bytes.
+        """
+        size = sys.getsizeof(self) + sys.getsizeof(self._values) + \
+            self.fst.nbytes()
+        for name, value in zip(self.field_names, self._values):
+            if value is not None and name not in self.interned_fields:
+                size += sys.getsizeof(value)
+        return size
@@ -0,0 +1,250 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Size-bounded mapping that evicts the least recently used entry when
+    it is full. Used for caching Voikko analyses by surface string and
+    final lemmas by (surface string, part-of-speech). Empty results, such as
+    the analyses of out-of-vocabulary words, are cached like any other value.
+    The cache can be shared between threads.
+    """
+
+    def __init__(self, max_size=100000):
+        """Initialize the cache.
+
+        max_size (int): Maximum number of cached entries.
+        RETURNS (LRUCache): The newly constructed object.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be positive, got {}".format(max_size))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Look up the cached value of a key and mark it as recently used.
+
+        key: The cache key.
+        default: Value returned if the key is not cached.
+        RETURNS: The cached value or `default`.
+        """
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entry if the
+        cache is full.
+
+        key: The cache key.
+        value: The value to cache.
+        """
+        with self._lock:
+            entries = self._entries
+            entries[key] = value
+            entries.move_to_end(key)
+            if len(entries) > self.max_size:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries. The counters are not reset."""
+        with self._lock:
+            self._entries.clear()
+
+    def items(self):
+        """RETURNS (list): The (key, value) pairs, least recently used first."""
+        with self._lock:
+            return list(self._entries.items())
+
+    def stats(self):
+        """Summarize the cache usage.
+
+        RETURNS (dict): The size and the hit, miss and eviction counts.
+        """
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def estimate_size(key, value):
+    """Estimate the memory used by a cache entry. Objects with an `nbytes`
+    method, such as analyses, report their own size.
+
+    key: The cache key.
+    value: The cached value, a tuple or a single object.
+    RETURNS (int): The estimated size in bytes.
+    """
+    size = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, tuple):
+        for item in value:
+            nbytes = getattr(item, "nbytes", None)
+            size += nbytes() if nbytes is not None else sys.getsizeof(item)
+    return size
+
+
+class SizedLRUCache(LRUCache):
+    """LRUCache bounded by the estimated memory use of its entries instead
+    of their number. Least recently used entries are evicted until the
+    entries fit in the budget.
+    """
+
+    def __init__(self, max_bytes, sizeof=estimate_size):
+        """Initialize the cache.
+
+        max_bytes (int): Memory budget of the entries in bytes.
+        sizeof (callable): Function that estimates the size of an entry from
+            its key and value. It must return the same size for an entry
+            every time.
+        RETURNS (SizedLRUCache): The newly constructed object.
+        """
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be positive, got {}".format(max_bytes))
+        super(SizedLRUCache, self).__init__(sys.maxsize)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._sizeof = sizeof
+
+    def set(self, key, value):
+        sizeof = self._sizeof
+        size = sizeof(key, value)
+        with self._lock:
+            entries = self._entries
+            if key in entries:
+                self.nbytes -= sizeof(key, entries[key])
+            entries[key] = value
+            entries.move_to_end(key)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(entries) > 1:
+                old_key, old_value = entries.popitem(last=False)
+                self.nbytes -= sizeof(old_key, old_value)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Summarize the cache usage.
+
+        RETURNS (dict): The size, the estimated memory use in bytes and the
+            hit, miss and eviction counts.
+        """
+        stats = super(SizedLRUCache, self).stats()
+        stats["max_size"] = None
+        stats["bytes"] = self.nbytes
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+class DiskAnalysisCache(object):
+    """Voikko analyses stored in an SQLite database, so that they survive
+    restarts and are shared by all processes using the same file.
+
+    Entries are keyed by the Voikko version as well as the surface string,
+    so analyses made with a different library or dictionary are ignored.
+    The database uses write-ahead logging, which lets readers proceed while
+    another process is writing.
+    """
+
+    def __init__(self, path, version, timeout=30.0):
+        """Open or create the database.
+
+        path (unicode): Path of the database file.
+        version (unicode / callable): Version of the Voikko library and
+            dictionary, see `fi.pool.voikko_version`, or a function that
+            returns it. The function is called on the first lookup or store,
+            so that opening the cache doesn't load libvoikko.
+        timeout (float): Seconds to wait for another process holding a lock.
+        RETURNS (DiskAnalysisCache): The newly constructed object.
+        """
+        self.path = path
+        self._version = version
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "version TEXT NOT NULL, string TEXT NOT NULL, analyses TEXT NOT NULL, "
+            "PRIMARY KEY (version, string)) WITHOUT ROWID"
+        )
+
+    @property
+    def version(self):
+        """RETURNS (unicode): The Voikko version the entries are keyed by."""
+        if callable(self._version):
+            self._version = self._version()
+        return self._version
+
+    def get(self, key, default=None):
+        """Look up the analyses of a surface string.
+
+        key (unicode): The surface string.
+        default: Value returned if the string is not cached.
+        RETURNS (tuple): The analysis dicts or `default`.
+        """
+        row = self._connection().execute(
+            "SELECT analyses FROM analyses WHERE version = ? AND string = ?",
+            (self.version, key),
+        ).fetchone()
+        if row is None:
+            return default
+        return tuple(json.loads(row[0]))
+
+    def set(self, key, value):
+        """Store the analyses of a surface string. An existing entry, written
+        by another process, is kept.
+
+        key (unicode): The surface string.
+        value (iterable): The analysis dicts.
+        """
+        self._connection().execute(
+            "INSERT OR IGNORE INTO analyses VALUES (?, ?, ?)",
+            (self.version, key, json.dumps(list(value), ensure_ascii=False)),
+        )
+
+    def clear(self):
+        """Remove the entries of all versions."""
+        self._connection().execute("DELETE FROM analyses")
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads or carried
+        # over a fork
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None,
+                check_same_thread=False,
+            )
+            local.conn.execute("PRAGMA synchronous=NORMAL")
+            local.pid = os.getpid()
+        return local.conn
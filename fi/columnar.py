@@ -0,0 +1,103 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import numpy
+
+
+def lemmatize_array(lemmatizer, forms, univ_pos, best=True):
+    """Lemmatize a column of strings, e.g. a NumPy array or a pandas Series.
+
+    The strings and the part-of-speech tags are factorized into codes, only
+    the distinct (string, part-of-speech) pairs are lemmatized, and the
+    result is expanded to the rows with a vectorized take. The Python-level
+    work therefore depends on the size of the vocabulary, not the number of
+    rows.
+
+    lemmatizer (FinnishLemmatizer): The lemmatizer.
+    forms (array-like): The strings. A pandas Categorical, or a Series of
+        the category dtype, is used as already factorized. Missing values,
+        None or NaN, get the lemma None.
+    univ_pos (array-like / unicode / int): Part-of-speech tags of the rows,
+        as names, spaCy symbol IDs or a pandas Categorical of either, or one
+        tag for all rows.
+    best (bool): Return only the best lemma of each row, as given by
+        `lemmatize_best`, instead of the tuple of all lemmas.
+    RETURNS (numpy.ndarray): Object array of the lemmas of the rows.
+    """
+    form_codes, form_uniques = _factorize(forms)
+    if numpy.ndim(univ_pos) == 0 and not _is_categorical(univ_pos):
+        pos_codes = numpy.zeros(len(form_codes), dtype=numpy.int64)
+        pos_uniques = [univ_pos]
+    else:
+        pos_codes, pos_uniques = _factorize(univ_pos)
+    if len(pos_codes) != len(form_codes):
+        raise ValueError("forms and univ_pos differ in length: {} != {}".format(
+            len(form_codes), len(pos_codes)))
+
+    # Tags are normalized once per category instead of once per row
+    univ_pos_names = lemmatizer.univ_pos_names
+    pos_names = [univ_pos_names.get(x) for x in pos_uniques]
+    n_pos = max(len(pos_names), 1)
+    pairs, inverse = numpy.unique(form_codes * n_pos + pos_codes,
+                                  return_inverse=True)
+
+    lemmas = numpy.empty(len(pairs), dtype=object)
+    lemmatize = lemmatizer.lemmatize_best if best else lemmatizer
+    for i, pair in enumerate(pairs.tolist()):
+        form = form_uniques[pair // n_pos]
+        if form is not None:
+            lemmas[i] = lemmatize(form, pos_names[pair % n_pos])
+    return lemmas.take(inverse)
+
+
+def _is_categorical(values):
+    return hasattr(values, "cat") or (
+        hasattr(values, "codes") and hasattr(values, "categories"))
+
+
+def _factorize(values):
+    # RETURNS: int64 codes and the list of values they refer to
+    if hasattr(values, "cat"):
+        values = values.cat
+    if hasattr(values, "codes") and hasattr(values, "categories"):
+        codes = numpy.asarray(values.codes, dtype=numpy.int64)
+        uniques = list(values.categories)
+        if len(codes) and codes.min() < 0:
+            # Missing values
+            codes = numpy.where(codes < 0, len(uniques), codes)
+            uniques.append(None)
+        return codes, uniques
+
+    missing = _missing(values)
+    values = numpy.asarray(values)
+    if missing is None:
+        missing = _missing(values)
+    if missing is None or not missing.any():
+        uniques, codes = numpy.unique(values, return_inverse=True)
+        return codes.astype(numpy.int64), uniques.tolist()
+
+    uniques, present_codes = numpy.unique(values[~missing], return_inverse=True)
+    uniques = uniques.tolist()
+    codes = numpy.full(len(values), len(uniques), dtype=numpy.int64)
+    codes[~missing] = present_codes
+    uniques.append(None)
+    return codes, uniques
+
+
+def _missing(values):
+    # RETURNS: Boolean mask of the None and NaN values, or None if the
+    # values can't be missing
+    if hasattr(values, "isna"):
+        # pandas, which may also use pandas.NA
+        return numpy.asarray(values.isna(), dtype=bool)
+    elif hasattr(values, "is_null"):
+        # Arrow
+        return numpy.asarray(values.is_null(), dtype=bool)
+    elif not isinstance(values, numpy.ndarray):
+        return None
+    elif values.dtype.kind == "O":
+        # Missing values can't be sorted among the strings
+        return (values == None) | (values != values)  # noqa: E711
+    elif values.dtype.kind == "f":
+        return numpy.isnan(values)
+    return None
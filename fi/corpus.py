@@ -0,0 +1,117 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import io
+
+
+def iter_conllu_tokens(lines):
+    """Read the syntactic words of CoNLL-U data.
+
+    Comments, multiword token ranges and empty nodes are skipped.
+
+    lines (iterable): Lines of CoNLL-U data.
+    YIELDS (tuple): The (form, upos) of each word.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        columns = line.split("\t")
+        if "-" in columns[0] or "." in columns[0]:
+            continue
+        yield columns[1], columns[3]
+
+
+def iter_frequency_list(lines):
+    """Read a tab-separated frequency list with the columns form, UPOS and
+    an optional count.
+
+    lines (iterable): Lines of the frequency list.
+    YIELDS (tuple): The (form, upos, count) of each entry. Count is 1 if the
+        column is missing.
+    """
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line or line.startswith("#"):
+            continue
+
+        columns = line.split("\t")
+        count = int(columns[2]) if len(columns) > 2 else 1
+        yield columns[0], columns[1], count
+
+
+def count_pairs(paths, fmt="conllu"):
+    """Count the (form, upos) pairs in CoNLL-U files or frequency lists.
+
+    paths (iterable): Paths of the input files.
+    fmt (unicode): Input format, "conllu" or "freq".
+    RETURNS (dict): Count of each (form, upos) pair.
+    """
+    counts = {}
+    for path in paths:
+        with io.open(path, encoding="utf-8") as f:
+            if fmt == "conllu":
+                entries = ((form, upos, 1) for form, upos in iter_conllu_tokens(f))
+            elif fmt == "freq":
+                entries = iter_frequency_list(f)
+            else:
+                raise ValueError("Unknown input format: {}".format(fmt))
+
+            for form, upos, count in entries:
+                key = (form, upos)
+                counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+def lemmatize_lines(lemmatizer, lines, fmt="conllu"):
+    """Fill in the lemmas of CoNLL-U or token-per-line TSV data.
+
+    In CoNLL-U, the LEMMA column of every syntactic word is replaced with
+    its best lemma. Comments, multiword token ranges and empty nodes are
+    copied unchanged. TSV lines have the columns form and UPOS, and the
+    lemma is written in the third column, replacing an existing one. Empty
+    lines are copied. AUX is lemmatized as VERB.
+
+    lemmatizer (FinnishLemmatizer): The lemmatizer.
+    lines (list): Lines without line terminators.
+    fmt (unicode): Input format, "conllu" or "tsv".
+    RETURNS (unicode): The output lines, each terminated by a newline.
+    """
+    if fmt == "conllu":
+        form_col, upos_col, lemma_col = 1, 3, 2
+    elif fmt == "tsv":
+        form_col, upos_col, lemma_col = 0, 1, 2
+    else:
+        raise ValueError("Unknown input format: {}".format(fmt))
+
+    rows = []
+    pairs = []
+    for line in lines:
+        if not line or (fmt == "conllu" and line.startswith("#")):
+            rows.append(line)
+            continue
+
+        columns = line.split("\t")
+        if fmt == "conllu" and ("-" in columns[0] or "." in columns[0]):
+            rows.append(line)
+            continue
+
+        upos = columns[upos_col] if len(columns) > upos_col else None
+        pairs.append((columns[form_col], "VERB" if upos == "AUX" else upos))
+        rows.append(columns)
+
+    lemmas = iter(lemmatizer.lemmatize_many(pairs))
+    output = []
+    for row in rows:
+        if isinstance(row, list):
+            lemma = next(lemmas)[0]
+            if len(row) > lemma_col:
+                row[lemma_col] = lemma
+            else:
+                row.extend(["_"] * (lemma_col - len(row)))
+                row.append(lemma)
+            row = "\t".join(row)
+        output.append(row)
+        output.append("\n")
+    return "".join(output)
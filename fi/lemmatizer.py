@@ -1,22 +1,36 @@
 # coding: utf8
 from __future__ import unicode_literals
 
+import io
 import json
-import re
+import os
+import threading
 from collections import OrderedDict
-from itertools import chain
+from functools import partial
+from itertools import chain, islice
+from time import perf_counter
 
+import srsly
+from spacy import util
 from spacy.lemmatizer import Lemmatizer
 from spacy.lookups import Lookups
 from spacy.symbols import NOUN, VERB, ADJ, PUNCT, PROPN, ADV, NUM
-from voikko import libvoikko
+
+from .analysis import Analysis
+from .cache import DiskAnalysisCache, LRUCache, SizedLRUCache
+from .lexicon import ExceptionStore, LemmaTable
+from .pool import VoikkoPool, voikko_version
+from .rules import SuffixRules
+from .shapes import ShapeClassifier
+from .stats import LemmatizerStats
+from .tiers import TierChain, default_tiers
+
+
+LOOKUPS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lookups")
 
 
 class FinnishLemmatizer(Lemmatizer):
-    compound_re = re.compile(r"\+(\w+)(?:\(\+?[\w=]+\))?")
-    minen_re = re.compile(r"\b(\w+)\[Tn4\]mi")
-    sti_re = re.compile(r"\b(\w+)\[Ssti\]sti")
-    ny_re = re.compile(r"\[X\]\[\w+\]\[Ny\](\w+)")
     voikko_pos_to_upos = {
         "nimisana": "noun",
         "teonsana": "verb",
@@ -29,10 +43,93 @@ class FinnishLemmatizer(Lemmatizer):
         "sukunimi": "propn",
         "paikannimi": "propn",
     }
+    univ_pos_names = {
+        NOUN: "noun", "NOUN": "noun", "noun": "noun",
+        VERB: "verb", "VERB": "verb", "verb": "verb",
+        ADJ: "adj", "ADJ": "adj", "adj": "adj",
+        ADV: "adv", "ADV": "adv", "adv": "adv",
+        NUM: "num", "NUM": "num", "num": "num",
+        PROPN: "propn", "PROPN": "propn", "propn": "propn",
+        PUNCT: "punct", "PUNCT": "punct", "punct": "punct",
+    }
 
     def __init__(self, lookups, *args, **kwargs):
+        """Initialize a FinnishLemmatizer.
+
+        lookups (Lookups): The lookups object containing the (optional) tables
+            "lemma_rules", "lemma_index" and "lemma_exc".
+        analysis_cache_size (int): Maximum number of surface strings whose
+            Voikko analyses are cached. 0 disables the cache.
+        analysis_cache_bytes (int): Memory budget of the analysis cache in
+            bytes. Overrides `analysis_cache_size`.
+        result_cache_size (int): Maximum number of (string, part-of-speech)
+            pairs whose lemmas are cached. 0 disables the cache.
+        voikko_pool_size (int): Maximum number of Voikko handles. Threads
+            calling the lemmatizer concurrently use separate handles.
+        lemma_dict (unicode / LemmaTable): Precompiled lemmas, built with
+            scripts/build_lemma_dict.py, that are used instead of analyzing
+            the strings they contain.
+        exception_store (unicode / ExceptionStore): Memory-mapped exceptions,
+            written with scripts/convert_exceptions.py, that are consulted
+            before the "lemma_exc" table and the analysis.
+        disk_cache (unicode / DiskAnalysisCache): SQLite database file for
+            persisting Voikko analyses across processes and restarts.
+        lazy (bool): Create the Voikko handle on first use instead of
+            immediately.
+        stats (bool / LemmatizerStats): Collect per-stage counters and
+            timers in `self.stats`. Disabled by default.
+        shapes (bool / ShapeClassifier): Return numbers, URLs, e-mail
+            addresses, hashtags, emoji and overlong tokens as their own
+            lemmas without analyzing them. Enabled by default.
+        tiers (iterable / TierChain): The order of the lemma resolution
+            tiers, see `fi.tiers.TierChain`. Defaults to "cache", "shape",
+            "lookup", "store" and "voikko".
+        RETURNS (FinnishLemmatizer): The newly constructed object.
+        """
+        analysis_cache_size = kwargs.pop("analysis_cache_size", 100000)
+        analysis_cache_bytes = kwargs.pop("analysis_cache_bytes", None)
+        result_cache_size = kwargs.pop("result_cache_size", 100000)
+        voikko_pool_size = kwargs.pop("voikko_pool_size", 1)
+        lemma_dict = kwargs.pop("lemma_dict", None)
+        disk_cache = kwargs.pop("disk_cache", None)
+        exception_store = kwargs.pop("exception_store", None)
+        lazy = kwargs.pop("lazy", False)
+        stats = kwargs.pop("stats", None)
+        shapes = kwargs.pop("shapes", True)
+        tiers = kwargs.pop("tiers", None)
         super(FinnishLemmatizer, self).__init__(lookups, *args, **kwargs)
-        self.voikko = libvoikko.Voikko("fi")
+        if lemma_dict is not None and not isinstance(lemma_dict, LemmaTable):
+            lemma_dict = LemmaTable(lemma_dict)
+        self.lemma_dict = lemma_dict
+        if (exception_store is not None and
+            not isinstance(exception_store, ExceptionStore)
+        ):
+            exception_store = ExceptionStore(exception_store)
+        self.exception_store = exception_store
+        self.voikko_pool = VoikkoPool("fi", max_size=voikko_pool_size,
+                                      initial_size=0 if lazy else 1)
+        if disk_cache is not None and not isinstance(disk_cache, DiskAnalysisCache):
+            disk_cache = DiskAnalysisCache(disk_cache, partial(voikko_version, "fi"))
+        self.disk_cache = disk_cache
+        self.analysis_cache = self._create_analysis_cache(
+            analysis_cache_size, analysis_cache_bytes)
+        if result_cache_size > 0:
+            self.result_cache = LRUCache(result_cache_size)
+        else:
+            self.result_cache = None
+        self._cached_tables = None
+        self._suffix_rules = {}
+        if stats is True:
+            stats = LemmatizerStats()
+        self.stats = stats or None
+        if shapes is True:
+            shapes = ShapeClassifier()
+        self.shapes = shapes or None
+        if tiers is None:
+            tiers = TierChain()
+        elif not isinstance(tiers, TierChain):
+            tiers = TierChain(tiers)
+        self.tiers = tiers
 
     def __call__(self, string, univ_pos, morphology=None):
         """Lemmatize a string.
@@ -41,36 +138,349 @@ class FinnishLemmatizer(Lemmatizer):
         univ_pos (unicode / int): The token's universal part-of-speech tag.
         morphology (dict): The token's morphological features following the
             Universal Dependencies scheme.
-        RETURNS (list): The available lemmas for the string.
+        RETURNS (tuple): The available lemmas for the string.
+        """
+        univ_pos = self.univ_pos_names.get(univ_pos)
+        return self._cached_lemmas(string, univ_pos, self._lemma_tables())
+
+    def lemmatize_many(self, pairs):
+        """Lemmatize a batch of strings. Each distinct (string, part-of-speech)
+        pair is lemmatized only once.
+
+        pairs (iterable): Tuples of (string, univ_pos), as accepted by
+            `__call__`.
+        RETURNS (list): The lemma tuples in the order of the input pairs.
+        """
+        univ_pos_names = self.univ_pos_names
+        keys = [(string, univ_pos_names.get(univ_pos))
+                for string, univ_pos in pairs]
+        tables = self._lemma_tables()
+        unique = {}
+        for key in keys:
+            if key not in unique:
+                unique[key] = self._cached_lemmas(key[0], key[1], tables)
+        return [unique[key] for key in keys]
+
+    def lemmatize_stream(self, pairs, batch_size=10000):
+        """Lemmatize a stream of strings in batches of bounded size.
+
+        pairs (iterable): Tuples of (string, univ_pos), as accepted by
+            `__call__`.
+        batch_size (int): Number of pairs lemmatized together.
+        YIELDS (tuple): The lemmas of each input pair in order.
+        """
+        pairs = iter(pairs)
+        while True:
+            batch = list(islice(pairs, batch_size))
+            if not batch:
+                break
+            for lemmas in self.lemmatize_many(batch):
+                yield lemmas
+
+    def lemmatize_best(self, string, univ_pos):
+        """Find only the best lemma of a string, which is the first lemma
+        returned by `__call__`. Stops as soon as the best lemma is known,
+        e.g. on an authoritative exception or the first analysis of the
+        requested part-of-speech. The result is not cached, but cached
+        results of `__call__` are used. With other than the default tiers,
+        this is the first lemma of `__call__`.
+
+        string (unicode): The string to lemmatize, e.g. the token text.
+        univ_pos (unicode / int): The token's universal part-of-speech tag.
+        RETURNS (unicode): The best lemma.
+        """
+        univ_pos = self.univ_pos_names.get(univ_pos)
+        if univ_pos is None:
+            return string.lower()
+        elif univ_pos == "punct":
+            return string
+        elif not self.tiers.is_default:
+            return self._cached_lemmas(string, univ_pos, self._lemma_tables())[0]
+
+        if self.stats is not None:
+            self.stats.tick()
+
+        tables = self._lemma_tables()
+        if self.result_cache is not None:
+            lemmas = self.result_cache.get((string, univ_pos))
+            if lemmas is not None:
+                return lemmas[0]
+
+        if self.shapes is not None and self.shapes(string) is not None:
+            return string
+
+        if self.lemma_dict is not None:
+            lemmas = self.lemma_dict.get(string, univ_pos)
+            if lemmas is not None:
+                self._count("lemma_dict")
+                return lemmas[0]
+
+        index_table, exc_table, rules_table = (t or {} for t in tables)
+        exceptions = exc_table.get(univ_pos, {})
+        rules = self._compiled_rules(univ_pos, index_table, rules_table)
+        prefix, hyphen, last = string.rpartition("-")
+        lemma = self.lemmatize_best_compound(last, exceptions, rules, univ_pos)
+        if hyphen:
+            self._count("hyphen")
+            return prefix + hyphen + lemma
+        return lemma
+
+    def clear_cache(self):
+        """Empty the analysis and result caches. Call this after modifying
+        the lemma tables in place. Adding, removing or replacing a table is
+        detected automatically.
         """
-        if univ_pos in (NOUN, "NOUN", "noun"):
-            univ_pos = "noun"
-        elif univ_pos in (VERB, "VERB", "verb"):
-            univ_pos = "verb"
-        elif univ_pos in (ADJ, "ADJ", "adj"):
-            univ_pos = "adj"
-        elif univ_pos in (ADV, "ADV", "adv"):
-            univ_pos = "adv"
-        elif univ_pos in (NUM, "NUM", "num"):
-            univ_pos = "num"
-        elif univ_pos in (PROPN, "PROPN", "propn"):
-            univ_pos = "propn"
-        elif univ_pos in (PUNCT, "PUNCT", "punct"):
-            return [string]
+        if self.analysis_cache is not None:
+            self.analysis_cache.clear()
+        if self.result_cache is not None:
+            self.result_cache.clear()
+        self._cached_tables = None
+        self._suffix_rules = {}
+
+    def __getstate__(self):
+        # The Tier objects are pickled, so unregistered tiers are kept too
+        return {"bytes": self.to_bytes(), "tiers": self.tiers.tiers}
+
+    def __setstate__(self, state):
+        self.__init__(Lookups(), lazy=True, tiers=state["tiers"])
+        self.from_bytes(state["bytes"])
+
+    def to_bytes(self, exclude=tuple()):
+        """Serialize the lemmatizer to a bytestring. The Voikko handles are
+        not serialized; a deserialized lemmatizer opens them on first use.
+        The memory-mapped files and the disk cache are referenced by path,
+        and the tiers by name.
+
+        exclude (list): String names of serialization fields to exclude:
+            "cfg", "lookups", "analysis_cache" and "result_cache".
+        RETURNS (bytes): The serialized form of the lemmatizer.
+        """
+        serialize = OrderedDict((
+            ("cfg", self._get_config),
+            ("lookups", self.lookups.to_bytes),
+            ("analysis_cache", self._get_analysis_cache),
+            ("result_cache", self._get_result_cache),
+        ))
+        return util.to_bytes(serialize, exclude)
+
+    def from_bytes(self, bytes_data, exclude=tuple()):
+        """Load the lemmatizer from a bytestring.
+
+        bytes_data (bytes): The data to load from.
+        exclude (list): String names of serialization fields to exclude.
+        RETURNS (FinnishLemmatizer): The loaded lemmatizer.
+        """
+        deserialize = OrderedDict((
+            ("cfg", self._set_config),
+            ("lookups", lambda b: self._set_lookups(Lookups().from_bytes(b))),
+            ("analysis_cache", self._set_analysis_cache),
+            ("result_cache", self._set_result_cache),
+        ))
+        util.from_bytes(bytes_data, deserialize, exclude)
+        return self
+
+    def to_disk(self, path, exclude=tuple()):
+        """Save the lemmatizer to a directory.
+
+        path (unicode / Path): A path to a directory, which will be created
+            if it doesn't exist.
+        exclude (list): String names of serialization fields to exclude.
+        """
+        serialize = OrderedDict((
+            ("cfg", lambda p: srsly.write_json(p, self._get_config())),
+            ("lookups", self._write_lookups),
+            ("analysis_cache",
+             lambda p: srsly.write_msgpack(p, self._get_analysis_cache())),
+            ("result_cache",
+             lambda p: srsly.write_msgpack(p, self._get_result_cache())),
+        ))
+        util.to_disk(path, serialize, exclude)
+
+    def from_disk(self, path, exclude=tuple()):
+        """Load the lemmatizer from a directory written by `to_disk`.
+
+        path (unicode / Path): A path to a directory.
+        exclude (list): String names of serialization fields to exclude.
+        RETURNS (FinnishLemmatizer): The loaded lemmatizer.
+        """
+        deserialize = OrderedDict((
+            ("cfg", lambda p: self._set_config(srsly.read_json(p))),
+            ("lookups", self._read_lookups),
+            ("analysis_cache",
+             lambda p: self._set_analysis_cache(srsly.read_msgpack(p))),
+            ("result_cache",
+             lambda p: self._set_result_cache(srsly.read_msgpack(p))),
+        ))
+        util.from_disk(path, deserialize, exclude)
+        return self
+
+    def _get_config(self):
+        stats = self.stats
+        shapes = self.shapes
+        return {
+            "analysis_cache_size": self.analysis_cache.max_size
+                if self.analysis_cache is not None else 0,
+            "analysis_cache_bytes": self.analysis_cache.max_bytes
+                if isinstance(self.analysis_cache, SizedLRUCache) else None,
+            "result_cache_size": self.result_cache.max_size
+                if self.result_cache is not None else 0,
+            "voikko_pool_size": self.voikko_pool.max_size,
+            "lemma_dict": self.lemma_dict.path
+                if self.lemma_dict is not None else None,
+            "exception_store": self.exception_store.table.path
+                if self.exception_store is not None else None,
+            "disk_cache": self.disk_cache.path
+                if self.disk_cache is not None else None,
+            # The counters and the callback stay with this process
+            "stats": {
+                "interval": stats.interval,
+                "slow_threshold": stats.slow_threshold,
+                "max_slow": stats.slow.maxlen,
+            } if stats is not None else None,
+            "shapes": {
+                "classes": list(shapes.classes),
+                "max_length": shapes.max_length or 64,
+            } if shapes is not None else None,
+            "tiers": self.tiers.names,
+        }
+
+    def _set_config(self, cfg):
+        self.voikko_pool.close()
+        self.voikko_pool = VoikkoPool("fi", max_size=cfg["voikko_pool_size"],
+                                      initial_size=0)
+        self.analysis_cache = self._create_analysis_cache(
+            cfg["analysis_cache_size"], cfg.get("analysis_cache_bytes"))
+        self.result_cache = LRUCache(cfg["result_cache_size"]) \
+            if cfg["result_cache_size"] > 0 else None
+        self.lemma_dict = LemmaTable(cfg["lemma_dict"]) \
+            if cfg["lemma_dict"] is not None else None
+        self.exception_store = ExceptionStore(cfg["exception_store"]) \
+            if cfg["exception_store"] is not None else None
+        self.disk_cache = DiskAnalysisCache(
+            cfg["disk_cache"], partial(voikko_version, "fi")) \
+            if cfg["disk_cache"] is not None else None
+        self.stats = LemmatizerStats(**cfg["stats"]) \
+            if cfg["stats"] is not None else None
+        self.shapes = ShapeClassifier(**cfg["shapes"]) \
+            if cfg["shapes"] is not None else None
+        # Tier objects of the same names, e.g. set by __setstate__, are kept
+        names = list(cfg.get("tiers", default_tiers))
+        if names != self.tiers.names:
+            self.tiers = TierChain(names)
+        self._cached_tables = None
+        self._suffix_rules = {}
+
+    def _create_analysis_cache(self, max_size, max_bytes):
+        if max_bytes is not None:
+            return SizedLRUCache(max_bytes)
+        elif max_size > 0:
+            return LRUCache(max_size)
         else:
-            return [string.lower()]
+            return None
+
+    def _write_lookups(self, path):
+        with path.open("wb") as f:
+            f.write(self.lookups.to_bytes())
+
+    def _read_lookups(self, path):
+        with path.open("rb") as f:
+            self._set_lookups(Lookups().from_bytes(f.read()))
+
+    def _set_lookups(self, lookups):
+        self.lookups = lookups
+        self._lemma_tables()
+
+    def _get_analysis_cache(self):
+        if self.analysis_cache is None:
+            return []
+        return [[string, [x.fields for x in analyses]]
+                for string, analyses in self.analysis_cache.items()]
+
+    def _set_analysis_cache(self, entries):
+        cache = self.analysis_cache
+        if cache is None:
+            return
+        cache.clear()
+        for string, fields in entries:
+            cache.set(string, tuple(Analysis(x) for x in fields))
+
+    def _get_result_cache(self):
+        if self.result_cache is None:
+            return []
+        return [[string, univ_pos, list(lemmas)]
+                for (string, univ_pos), lemmas in self.result_cache.items()]
+
+    def _set_result_cache(self, entries):
+        cache = self.result_cache
+        if cache is None:
+            return
+        # Pin the current tables, so that the restored lemmas are not
+        # discarded as stale on the first call
+        self._lemma_tables()
+        cache.clear()
+        for string, univ_pos, lemmas in entries:
+            cache.set((string, univ_pos), tuple(lemmas))
+
+    def _lemma_tables(self):
+        lookups = self.lookups
+        tables = (
+            lookups.get_table("lemma_index", None),
+            lookups.get_table("lemma_exc", None),
+            lookups.get_table("lemma_rules", None),
+        )
+        cached = self._cached_tables
+        if (cached is None or tables[0] is not cached[0] or
+            tables[1] is not cached[1] or tables[2] is not cached[2]
+        ):
+            # Lemmas cached from the earlier tables are stale
+            if self.result_cache is not None:
+                self.result_cache.clear()
+            self._suffix_rules = {}
+            self._cached_tables = tables
+        return tables
+
+    def _cached_lemmas(self, string, univ_pos, tables):
+        if univ_pos is None:
+            return (string.lower(),)
+        elif univ_pos == "punct":
+            return (string,)
+
+        if self.stats is not None:
+            self.stats.tick()
 
-        index_table = self.lookups.get_table("lemma_index", {})
-        exc_table = self.lookups.get_table("lemma_exc", {})
-        rules_table = self.lookups.get_table("lemma_rules", {})
-        lemmas = self.lemmatize(
+        return self.tiers.resolve(self, string, univ_pos, tables)
+
+    def _timed_lemmatize_pos(self, string, univ_pos, tables):
+        stats = self.stats
+        if stats is None:
+            return tuple(self._lemmatize_pos(string, univ_pos, tables))
+
+        t0 = perf_counter()
+        lemmas = tuple(self._lemmatize_pos(string, univ_pos, tables))
+        stats.add_lemmatized(string, univ_pos, perf_counter() - t0)
+        return lemmas
+
+    def _lemmatize_pos(self, string, univ_pos, tables):
+        index_table, exc_table, rules_table = (t or {} for t in tables)
+        return self.lemmatize(
             string,
             index_table.get(univ_pos, {}),
             exc_table.get(univ_pos, {}),
-            rules_table.get(univ_pos, {}),
+            self._compiled_rules(univ_pos, index_table, rules_table),
             univ_pos,
         )
-        return lemmas
+
+    def _compiled_rules(self, univ_pos, index_table, rules_table):
+        try:
+            return self._suffix_rules[univ_pos]
+        except KeyError:
+            rules = rules_table.get(univ_pos)
+            if rules:
+                compiled = SuffixRules(rules, index_table.get(univ_pos, ()))
+            else:
+                compiled = None
+            self._suffix_rules[univ_pos] = compiled
+            return compiled
 
     def lemmatize(self, string, index, exceptions, rules, univ_pos):
         # lemmatize only the last part of hyphenated words: VGA-kaapelissa
@@ -80,40 +490,195 @@ class FinnishLemmatizer(Lemmatizer):
         if len(parts) == 1:
             return lemma
         else:
+            self._count("hyphen")
             return [parts[0] + "-" + lemma[0]]
 
     def lemmatize_compound(self, string, index, exceptions, rules, univ_pos):
+        """Lemmatize a string that contains no hyphens.
+
+        string (unicode): The string.
+        index (dict): Unused. The index is compiled into `rules`.
+        exceptions (dict): Lemma exceptions of the part-of-speech.
+        rules (SuffixRules): Suffix rules for guessing the lemmas of
+            strings Voikko doesn't recognize, or None.
+        univ_pos (unicode): The normalized part-of-speech.
+        RETURNS (list): The lemmas.
+        """
         orig = string
+        lower = orig.lower()
         oov_forms = []
         forms = []
 
-        analyses = self.voikko.analyze(string)
+        exception_list = exceptions.get(lower, [])
+        store = self.exception_store
+        if store is not None:
+            stored = store.get(lower, univ_pos)
+            if stored is not None:
+                self._count("exception_store")
+                if store.authoritative:
+                    return list(stored)
+                exception_list = list(stored) + exception_list
+
+        analyses = self._analyze(string)
+        stats = self.stats
+        if stats is not None:
+            t0 = perf_counter()
+            if not analyses:
+                stats.count("oov")
+
         base_and_pos = list(chain.from_iterable([
             self._baseform_and_pos(x, string) for x in analyses
         ]))
         matching_pos = [x for x in base_and_pos if x[1] == univ_pos]
         if univ_pos == "adv" and analyses:
-            oov_forms.append(self._normalize_adv(analyses[0], orig.lower()))
+            self._count("adv_normalize")
+            oov_forms.append(self._normalize_adv(analyses[0], lower))
         elif matching_pos:
             forms.extend(x[0] for x in matching_pos)
         elif analyses:
             oov_forms.extend(x[0] for x in base_and_pos)
+        elif rules is not None:
+            known, guesses = rules(string)
+            if known or guesses:
+                self._count("suffix_rules")
+            oov_forms.extend(OrderedDict.fromkeys(known + guesses))
 
         forms = list(OrderedDict.fromkeys(forms))
+        if stats is not None:
+            t1 = perf_counter()
+            stats.add_time("baseform", t1 - t0)
 
         # Put exceptions at the front of the list, so they get priority.
         # This is a dodgy heuristic -- but it's the best we can do until we get
         # frequencies on this. We can at least prune out problematic exceptions,
         # if they shadow more frequent analyses.
-        for exc in exceptions.get(orig.lower(), []):
+        for exc in exception_list:
             if exc not in forms:
                 forms.insert(0, exc)
+        if stats is not None:
+            stats.add_time("exceptions", perf_counter() - t1)
+
         if not forms:
             forms.extend(oov_forms)
         if not forms:
+            self._count("oov_fallback")
             forms.append(orig)
         return forms
 
+    def lemmatize_best_compound(self, string, exceptions, rules, univ_pos):
+        """Find the first lemma `lemmatize_compound` would return.
+
+        string (unicode): The string. It contains no hyphens.
+        exceptions (dict): Lemma exceptions of the part-of-speech.
+        rules (SuffixRules): Suffix rules for out-of-vocabulary strings, or
+            None.
+        univ_pos (unicode): The normalized part-of-speech.
+        RETURNS (unicode): The lemma.
+        """
+        lower = string.lower()
+        exception_list = exceptions.get(lower, ())
+        store = self.exception_store
+        if store is not None:
+            stored = store.get(lower, univ_pos)
+            if stored is not None:
+                self._count("exception_store")
+                if store.authoritative:
+                    return stored[0]
+                exception_list = list(stored) + list(exception_list)
+
+        # Adverbs have no lemmas of their own part-of-speech, so every
+        # exception is put in front of the analysis
+        if exception_list and univ_pos == "adv":
+            return self._last_new_exception(exception_list, ())
+
+        analyses = self._analyze(string)
+        if not analyses:
+            self._count("oov")
+
+        if exception_list:
+            matching = set()
+            for analysis in analyses:
+                for form, pos in self._baseform_and_pos(analysis, string):
+                    if pos == univ_pos:
+                        matching.add(form)
+            lemma = self._last_new_exception(exception_list, matching)
+            if lemma is not None:
+                return lemma
+
+        if univ_pos == "adv" and analyses:
+            self._count("adv_normalize")
+            return self._normalize_adv(analyses[0], lower)
+
+        if analyses:
+            # Without a form of the part-of-speech, the first form of any
+            # part-of-speech is used
+            first = ()
+            for analysis in analyses:
+                for form, pos in self._baseform_and_pos(analysis, string):
+                    if pos == univ_pos:
+                        return form
+                    elif first == ():
+                        first = form
+            if first != ():
+                return first
+
+        if rules is not None:
+            known, guesses = rules(string)
+            if known or guesses:
+                self._count("suffix_rules")
+                return known[0] if known else guesses[0]
+
+        self._count("oov_fallback")
+        return string
+
+    def _last_new_exception(self, exception_list, forms):
+        # The exception that `lemmatize_compound` inserts last in front of
+        # the forms: the last one that is neither among the forms nor a
+        # repetition of an earlier exception
+        for i in range(len(exception_list) - 1, -1, -1):
+            exc = exception_list[i]
+            if exc not in forms and exc not in exception_list[:i]:
+                return exc
+        return None
+
+    def _analyze(self, string):
+        cache = self.analysis_cache
+        if cache is not None:
+            analyses = cache.get(string)
+            if analyses is not None:
+                return analyses
+
+        disk_cache = self.disk_cache
+        fields = None
+        if disk_cache is not None:
+            fields = disk_cache.get(string)
+        if fields is None:
+            fields = self._voikko_analyze(string)
+            if disk_cache is not None:
+                disk_cache.set(string, fields)
+        analyses = tuple(Analysis(x) for x in fields)
+        if cache is not None:
+            cache.set(string, analyses)
+        return analyses
+
+    def _voikko_analyze(self, string):
+        stats = self.stats
+        if stats is not None:
+            t0 = perf_counter()
+
+        pool = self.voikko_pool
+        voikko = pool.acquire()
+        try:
+            return voikko.analyze(string)
+        finally:
+            pool.release(voikko)
+            if stats is not None:
+                stats.add_time("analyze", perf_counter() - t0)
+
+    def _count(self, name):
+        if self.stats is not None:
+            self.stats.count(name)
+
     def _baseform_and_pos(self, analysis, orig):
         baseform = analysis.get("BASEFORM")
         voikko_class = analysis.get("CLASS")
@@ -122,7 +687,8 @@ class FinnishLemmatizer(Lemmatizer):
             analysis.get("MOOD") == "MINEN-infinitive"
         ):
             # MINEN infinitive
-            form = self._fst_form(analysis, self.minen_re, "minen")
+            self._count("branch.minen")
+            form = self._fst_form(analysis, "Tn4", "mi", "minen")
             if form:
                 return [(form, "noun")]
             else:
@@ -135,6 +701,7 @@ class FinnishLemmatizer(Lemmatizer):
                                              "present_passive"]
         ):
             # VA, NUT and TU participles
+            self._count("branch.participle")
             return [
                 (self._first_wordbase(analysis), "verb"),
                 (baseform, "adj")
@@ -144,49 +711,65 @@ class FinnishLemmatizer(Lemmatizer):
               analysis.get("PARTICIPLE") == "agent"
         ):
             # agent participle
+            self._count("branch.agent_participle")
             return [(self._first_wordbase(analysis), "verb")]
 
         elif (voikko_class in ["laatusana", "lukusana"] and
               analysis.get("SIJAMUOTO") == "kerrontosti"
         ):
-            form = self._fst_form(analysis, self.sti_re, "sti")
+            self._count("branch.kerrontosti")
+            form = self._fst_form(analysis, "Ssti", "sti", "sti")
             if form:
                 return [(form, "adv")]
             else:
                 return [(baseform, self.voikko_pos_to_upos[voikko_class])]
 
         elif voikko_class == "seikkasana" and orig.endswith("itse"):
+            self._count("branch.itse")
             return [(orig, "adv")]
 
         elif voikko_class in self.voikko_pos_to_upos:
+            self._count("branch.baseform")
             return [(baseform, self.voikko_pos_to_upos[voikko_class])]
 
         else:
+            self._count("branch.unknown_class")
             return [(baseform, None)]
 
-    def _fst_form(self, analysis, stem_re, suffix):
-        fstoutput = analysis.get("FSTOUTPUT")
-        ny_match = self.ny_re.search(fstoutput)
-        if ny_match:
-            return ny_match.group(1)
+    def _fst_form(self, analysis, tag, following, suffix):
+        stats = self.stats
+        if stats is None:
+            return self._fst_form_untimed(analysis, tag, following, suffix)
 
-        fst_match = stem_re.search(fstoutput)
-        if not fst_match:
+        t0 = perf_counter()
+        form = self._fst_form_untimed(analysis, tag, following, suffix)
+        stats.add_time("fst", perf_counter() - t0)
+        return form
+
+    def _fst_form_untimed(self, analysis, tag, following, suffix):
+        fst = analysis.fst
+        if fst.ny_stem:
+            return fst.ny_stem
+
+        stem = fst.stem(tag, following)
+        if not stem:
             return None
 
-        stem = fst_match.group(1)
-        compounds = self.compound_re.findall(analysis.get("WORDBASES"))
+        compounds = fst.compounds
         if len(compounds) > 1:
             return "".join(compounds[:-1]) + stem + suffix
         else:
             return stem + suffix
 
     def _first_wordbase(self, analysis):
-        m = re.search(r"\((\w+)\)", analysis.get("WORDBASES"))
-        if m:
-            return m.group(1)
-        else:
-            return analysis.get("BASEFORM")
+        stats = self.stats
+        if stats is None:
+            return analysis.fst.first_wordbase or analysis.get("BASEFORM")
+
+        t0 = perf_counter()
+        form = analysis.fst.first_wordbase or analysis.get("BASEFORM")
+        stats.add_time("fst", perf_counter() - t0)
+        return form
 
     def _normalize_adv(self, analysis, word):
         focus = analysis.get("FOCUS")
@@ -210,8 +793,76 @@ class FinnishLemmatizer(Lemmatizer):
             return word
 
 
-def create_lemmatizer():
+class LazyLookups(Lookups):
+    """Lookups whose tables are loaded when they are first accessed."""
+
+    def __init__(self, loader):
+        """Initialize the lookups.
+
+        loader (callable): Function that returns the loaded Lookups.
+        RETURNS (LazyLookups): The newly constructed object.
+        """
+        self._loader = loader
+        self._load_lock = threading.Lock()
+        super(LazyLookups, self).__init__()
+
+    @property
+    def _tables(self):
+        if self._loader is not None:
+            with self._load_lock:
+                if self._loader is not None:
+                    loaded = self._loader()
+                    self.__dict__["_tables"] = OrderedDict(
+                        (name, loaded.get_table(name)) for name in loaded.tables)
+                    self._loader = None
+        return self.__dict__["_tables"]
+
+    @_tables.setter
+    def _tables(self, tables):
+        self.__dict__["_tables"] = tables
+
+
+def load_lookups(snapshot=None):
+    """Load the lemmatizer lookup tables.
+
+    snapshot (unicode): Path of a file written by `save_lookups_snapshot`.
+        By default the tables are parsed from the JSON files in the lookups
+        directory.
+    RETURNS (Lookups): The lookup tables.
+    """
     lookups = Lookups()
-    with open("lookups/fi_lemma_exc.json") as f:
-        lookups.add_table("lemma_exc", json.load(f))
-    return FinnishLemmatizer(lookups)
+    if snapshot is not None:
+        with io.open(snapshot, "rb") as f:
+            lookups.from_bytes(f.read())
+    else:
+        path = os.path.join(LOOKUPS_DIR, "fi_lemma_exc.json")
+        with io.open(path, encoding="utf-8") as f:
+            lookups.add_table("lemma_exc", json.load(f))
+    return lookups
+
+
+def save_lookups_snapshot(path):
+    """Save the lookup tables in spaCy's binary format, which loads faster
+    than the JSON files.
+
+    path (unicode): Path of the output file.
+    """
+    with io.open(path, "wb") as f:
+        f.write(load_lookups().to_bytes())
+
+
+def create_lemmatizer(snapshot=None, lazy=False, **kwargs):
+    """Create a FinnishLemmatizer with the lookup tables of this package.
+
+    snapshot (unicode): Path of a lookups snapshot written by
+        `save_lookups_snapshot`.
+    lazy (bool): Load the lookup tables and create the Voikko handle on
+        first use.
+    **kwargs: Passed to FinnishLemmatizer.
+    RETURNS (FinnishLemmatizer): The lemmatizer.
+    """
+    if lazy:
+        lookups = LazyLookups(lambda: load_lookups(snapshot))
+    else:
+        lookups = load_lookups(snapshot)
+    return FinnishLemmatizer(lookups, lazy=lazy, **kwargs)
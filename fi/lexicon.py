@@ -0,0 +1,204 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import io
+import json
+import mmap
+import struct
+
+
+class LemmaTable(object):
+    """Read-only (string, part-of-speech) -> lemmas table in a memory-mapped
+    binary file.
+
+    The file is mapped read-only, so processes that open the same file share
+    one copy of it in the page cache. Opening a table does not read the
+    entries. Build a table with `LemmaTable.write`.
+
+    Identical lemma lists are stored once, and each list is decoded into
+    a single shared tuple.
+
+    File layout (little-endian):
+        magic (8 bytes), number of records N (uint32), number of lemma lists
+        M (uint32), flags (uint32),
+        N + 1 record offsets (uint32), M + 1 lemma list offsets (uint32),
+        N records sorted by key: key (UTF-8), lemma list number (uint32),
+        M lemma lists: lemmas (UTF-8) separated by US.
+    The key of a record is the string and the part-of-speech separated by
+    a TAB.
+    """
+
+    magic = b"FILEMMA2"
+    header = struct.Struct("<8sIII")
+    uint = struct.Struct("<I")
+
+    def __init__(self, path):
+        """Open a table file.
+
+        path (unicode): Path of the file written by `LemmaTable.write`.
+        RETURNS (LemmaTable): The newly constructed object.
+        """
+        self.path = path
+        with io.open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._size, self._num_lists, self.flags = \
+            self.header.unpack_from(self._mmap, 0)
+        if magic != self.magic:
+            raise ValueError("{} is not a lemma table file".format(path))
+        self._records_start = self.header.size
+        self._lists_start = self._records_start + (self._size + 1) * self.uint.size
+        self._lists = {}
+
+    def __len__(self):
+        return self._size
+
+    def get(self, string, univ_pos, default=None):
+        """Look up the lemmas of a string.
+
+        string (unicode): The string.
+        univ_pos (unicode): The normalized part-of-speech, e.g. "noun".
+        default: Value returned if the pair is not in the table.
+        RETURNS (tuple): The lemmas or `default`.
+        """
+        key = (string + "\t" + univ_pos).encode("utf-8")
+        data = self._mmap
+        lo = 0
+        hi = self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = struct.unpack_from(
+                "<II", data, self._records_start + mid * self.uint.size)
+            record_key = data[start:end - 4]
+            if record_key < key:
+                lo = mid + 1
+            elif record_key > key:
+                hi = mid
+            else:
+                return self._lemma_list(self.uint.unpack_from(data, end - 4)[0])
+        return default
+
+    def close(self):
+        self._mmap.close()
+
+    def _lemma_list(self, i):
+        try:
+            return self._lists[i]
+        except KeyError:
+            start, end = struct.unpack_from(
+                "<II", self._mmap, self._lists_start + i * self.uint.size)
+            lemmas = tuple(self._mmap[start:end].decode("utf-8").split("\x1f"))
+            return self._lists.setdefault(i, lemmas)
+
+    @classmethod
+    def write(cls, path, entries, flags=0):
+        """Write a table file.
+
+        path (unicode): Path of the output file.
+        entries (iterable): Tuples of ((string, univ_pos), lemmas).
+        flags (int): Format flags stored in the header.
+        """
+        list_numbers = {}
+        records = []
+        for (string, univ_pos), lemmas in entries:
+            value = "\x1f".join(lemmas).encode("utf-8")
+            number = list_numbers.setdefault(value, len(list_numbers))
+            records.append(((string + "\t" + univ_pos).encode("utf-8"), number))
+        records.sort()
+        lists = sorted(list_numbers, key=list_numbers.get)
+
+        position = (cls.header.size +
+                    (len(records) + len(lists) + 2) * cls.uint.size)
+        offsets = [position]
+        for key, _ in records:
+            position += len(key) + cls.uint.size
+            offsets.append(position)
+        list_offsets = [position]
+        for value in lists:
+            position += len(value)
+            list_offsets.append(position)
+
+        with io.open(path, "wb") as f:
+            f.write(cls.header.pack(cls.magic, len(records), len(lists), flags))
+            f.write(struct.pack("<{}I".format(len(offsets)), *offsets))
+            f.write(struct.pack("<{}I".format(len(list_offsets)), *list_offsets))
+            for key, number in records:
+                f.write(key)
+                f.write(cls.uint.pack(number))
+            for value in lists:
+                f.write(value)
+
+
+class ExceptionStore(object):
+    """Read-only lemma exceptions in a memory-mapped LemmaTable, for
+    exception lists too large to keep in the lookups.
+
+    The keys are lowercased when the store is written. If the store is
+    authoritative, its lemmas are returned without analyzing the string,
+    in the order the merge with the analysis would put them in. Otherwise
+    they are merged with the Voikko lemmas like the "lemma_exc" table.
+    """
+
+    AUTHORITATIVE = 1
+    # Authoritative lemmas are stored in merge order. Set on every store
+    # written since, so that older authoritative stores are rejected.
+    MERGE_ORDER = 2
+
+    def __init__(self, path):
+        """Open an exception store.
+
+        path (unicode): Path of the file written by `ExceptionStore.write`.
+        RETURNS (ExceptionStore): The newly constructed object.
+        """
+        self.table = LemmaTable(path)
+        self.authoritative = bool(self.table.flags & self.AUTHORITATIVE)
+        if self.authoritative and not self.table.flags & self.MERGE_ORDER:
+            self.table.close()
+            raise ValueError("{} is an authoritative exception store in an "
+                             "older format. Rebuild it with "
+                             "scripts/convert_exceptions.py".format(path))
+
+    def __len__(self):
+        return len(self.table)
+
+    def get(self, string, univ_pos):
+        """Look up the exceptions of a string.
+
+        string (unicode): The string. Matched case-insensitively.
+        univ_pos (unicode): The normalized part-of-speech.
+        RETURNS (tuple): The lemmas or None.
+        """
+        return self.table.get(string.lower(), univ_pos)
+
+    @classmethod
+    def write(cls, path, exceptions, authoritative=False):
+        """Write an exception store.
+
+        path (unicode): Path of the output file.
+        exceptions (dict): Exceptions in the format of the "lemma_exc" table:
+            part-of-speech -> string -> list of lemmas.
+        authoritative (bool): Whether the exceptions replace the analysis.
+        """
+        entries = {}
+        for univ_pos, table in exceptions.items():
+            for string, lemmas in table.items():
+                key = (string.lower(), univ_pos)
+                merged = entries.setdefault(key, [])
+                merged.extend(x for x in lemmas if x not in merged)
+        if authoritative:
+            # The order in which the merge with the analysis returns them:
+            # the last exception first
+            for lemmas in entries.values():
+                lemmas.reverse()
+        flags = cls.MERGE_ORDER | (cls.AUTHORITATIVE if authoritative else 0)
+        LemmaTable.write(path, entries.items(), flags)
+
+    @classmethod
+    def from_json(cls, json_path, path, authoritative=False):
+        """Convert a JSON file of the "lemma_exc" format into a store.
+
+        json_path (unicode): Path of the JSON exceptions.
+        path (unicode): Path of the output file.
+        authoritative (bool): Whether the exceptions replace the analysis.
+        """
+        with io.open(json_path, encoding="utf-8") as f:
+            cls.write(path, json.load(f), authoritative)
@@ -0,0 +1,132 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import multiprocessing
+import os
+import pickle
+from collections import deque
+from itertools import islice
+
+from .lemmatizer import create_lemmatizer
+
+
+# The lemmatizer of the current worker process, set by _init_worker()
+_worker_lemmatizer = None
+
+
+def _init_worker(kwargs, lemmatizer_pickle=None):
+    global _worker_lemmatizer
+    if lemmatizer_pickle is not None:
+        _worker_lemmatizer = pickle.loads(lemmatizer_pickle)
+    else:
+        _worker_lemmatizer = create_lemmatizer(**kwargs)
+
+
+def _lemmatize_chunk(pairs):
+    return _worker_lemmatizer.lemmatize_many(pairs)
+
+
+def _apply_chunk(func, chunk):
+    return func(_worker_lemmatizer, chunk)
+
+
+class ParallelLemmatizer(object):
+    """Lemmatize batches of strings on a pool of worker processes.
+
+    Every worker creates its own FinnishLemmatizer, and therefore owns a
+    separate Voikko handle, exception lookups and caches. Workers can start
+    from a copy of an existing lemmatizer, including its warm caches. The input is
+    split into chunks that are distributed to the workers, and the results
+    are yielded in input order.
+    """
+
+    def __init__(self, n_process=None, chunk_size=1000, max_in_flight=None,
+                 lemmatizer=None, **kwargs):
+        """Start the worker processes.
+
+        n_process (int): Number of worker processes. Defaults to the number
+            of CPUs.
+        chunk_size (int): Number of (string, univ_pos) pairs sent to a worker
+            at a time.
+        max_in_flight (int): Maximum number of chunks submitted but not yet
+            yielded. Bounds the memory used for buffered input and output.
+            Defaults to twice the number of workers.
+        lemmatizer (FinnishLemmatizer): Lemmatizer that is copied to each
+            worker, with its lookups and cached results. By default the
+            workers call `create_lemmatizer`.
+        **kwargs: Passed to `create_lemmatizer` in each worker.
+        RETURNS (ParallelLemmatizer): The newly constructed object.
+        """
+        if n_process is None:
+            n_process = os.cpu_count() or 1
+        self.n_process = n_process
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or 2 * n_process
+        # Pickled explicitly, so that forked workers don't inherit the Voikko
+        # handles, and unregistered custom tiers are kept
+        lemmatizer_pickle = pickle.dumps(lemmatizer) \
+            if lemmatizer is not None else None
+        self.pool = multiprocessing.Pool(n_process, _init_worker,
+                                         (kwargs, lemmatizer_pickle))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def lemmatize_many(self, pairs):
+        """Lemmatize a batch of strings in parallel.
+
+        pairs (iterable): Tuples of (string, univ_pos).
+        RETURNS (list): The lemma tuples in the order of the input pairs.
+        """
+        return list(self.lemmatize_stream(pairs))
+
+    def lemmatize_stream(self, pairs):
+        """Lemmatize a stream of strings in parallel.
+
+        pairs (iterable): Tuples of (string, univ_pos).
+        YIELDS (tuple): The lemmas of each input pair in order.
+        """
+        pairs = iter(pairs)
+        chunks = iter(lambda: list(islice(pairs, self.chunk_size)), [])
+        args = ((chunk,) for chunk in chunks)
+        for chunk_lemmas in self._imap(_lemmatize_chunk, args):
+            for lemmas in chunk_lemmas:
+                yield lemmas
+
+    def map_chunks(self, func, chunks):
+        """Process chunks of input with the workers' lemmatizers.
+
+        func (callable): Function called in a worker as
+            `func(lemmatizer, chunk)`. Must be picklable, e.g. a module-level
+            function.
+        chunks (iterable): The chunks, e.g. lists of lines.
+        YIELDS: The return value of `func` for each chunk in order.
+        """
+        return self._imap(_apply_chunk, ((func, chunk) for chunk in chunks))
+
+    def _imap(self, func, args):
+        # Calls func with each tuple of arguments in a worker. Results are
+        # yielded in input order with at most max_in_flight calls submitted
+        # but not yet yielded
+        args = iter(args)
+        pending = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.max_in_flight:
+                try:
+                    call_args = next(args)
+                except StopIteration:
+                    exhausted = True
+                else:
+                    pending.append(self.pool.apply_async(func, call_args))
+            if not pending:
+                break
+            yield pending.popleft().get()
+
+    def close(self):
+        """Wait for the workers to finish and stop them."""
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,106 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import numpy
+from spacy.attrs import LEMMA, ORTH, POS
+from spacy.language import Language
+from spacy.util import minibatch
+
+from .lemmatizer import create_lemmatizer
+
+
+class LemmatizerComponent(object):
+    """spaCy pipeline component that sets the lemmas of tagged Docs.
+
+    The distinct (text, part-of-speech) pairs of a Doc, or of a batch of
+    Docs in `pipe`, are lemmatized once with `lemmatize_many`, and the
+    lemmas are written to all tokens at once as StringStore hashes. The
+    component can be pickled, so it works with `nlp.pipe(n_process=...)`.
+
+    Add it after the tagger, e.g. `nlp.add_pipe(LemmatizerComponent())` or
+    `nlp.add_pipe(nlp.create_pipe("fi_lemmatizer"))`.
+    """
+
+    name = "fi_lemmatizer"
+
+    def __init__(self, lemmatizer=None, **kwargs):
+        """Initialize the component.
+
+        lemmatizer (FinnishLemmatizer): The lemmatizer. By default one is
+            created with `create_lemmatizer(**kwargs)`.
+        RETURNS (LemmatizerComponent): The newly constructed object.
+        """
+        if lemmatizer is None:
+            lemmatizer = create_lemmatizer(**kwargs)
+        self.lemmatizer = lemmatizer
+
+    def __call__(self, doc):
+        """Set the lemmas of a Doc.
+
+        doc (Doc): The tagged Doc.
+        RETURNS (Doc): The Doc.
+        """
+        self.set_lemmas([doc])
+        return doc
+
+    def pipe(self, docs, batch_size=1000):
+        """Set the lemmas of a stream of Docs.
+
+        docs (iterable): The tagged Docs.
+        batch_size (int): Number of Docs whose strings are deduplicated
+            together.
+        YIELDS (Doc): The Docs in order.
+        """
+        for batch in minibatch(docs, size=batch_size):
+            self.set_lemmas(batch)
+            for doc in batch:
+                yield doc
+
+    def set_lemmas(self, docs):
+        """Set the lemmas of a batch of Docs.
+
+        docs (list): The tagged Docs. They must share a Vocab.
+        """
+        docs = [doc for doc in docs if len(doc)]
+        if not docs:
+            return
+
+        attrs = numpy.concatenate([doc.to_array([ORTH, POS]) for doc in docs])
+        # Codes of (text, tag) pairs, from which the distinct pairs are found
+        # with a one-dimensional unique
+        orths, orth_codes = numpy.unique(attrs[:, 0], return_inverse=True)
+        tags, tag_codes = numpy.unique(attrs[:, 1], return_inverse=True)
+        pairs, inverse = numpy.unique(orth_codes * len(tags) + tag_codes,
+                                      return_inverse=True)
+        strings = docs[0].vocab.strings
+        orths = orths.tolist()
+        tags = tags.tolist()
+        lemmas = self.lemmatizer.lemmatize_many(
+            (strings[orths[pair // len(tags)]], tags[pair % len(tags)])
+            for pair in pairs.tolist())
+        lemma_ids = numpy.fromiter((strings.add(x[0]) for x in lemmas),
+                                   dtype=numpy.uint64, count=len(lemmas))
+
+        token_lemma_ids = lemma_ids[inverse].reshape((-1, 1))
+        start = 0
+        for doc in docs:
+            doc.from_array([LEMMA], token_lemma_ids[start:start + len(doc)])
+            start += len(doc)
+
+    def to_bytes(self, exclude=tuple(), **kwargs):
+        return self.lemmatizer.to_bytes(exclude=exclude)
+
+    def from_bytes(self, bytes_data, exclude=tuple(), **kwargs):
+        self.lemmatizer.from_bytes(bytes_data, exclude=exclude)
+        return self
+
+    def to_disk(self, path, exclude=tuple(), **kwargs):
+        self.lemmatizer.to_disk(path, exclude=exclude)
+
+    def from_disk(self, path, exclude=tuple(), **kwargs):
+        self.lemmatizer.from_disk(path, exclude=exclude)
+        return self
+
+
+Language.factories[LemmatizerComponent.name] = \
+    lambda nlp, **cfg: LemmatizerComponent(**cfg)
@@ -0,0 +1,117 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import threading
+from contextlib import contextmanager
+
+
+def voikko_version(language="fi"):
+    """Describe the installed Voikko library and dictionary.
+
+    language (unicode): The Voikko language code.
+    RETURNS (unicode): The library version and the dictionary description.
+    """
+    from voikko import libvoikko
+
+    dicts = [d.description for d in libvoikko.Voikko.listDicts()
+             if d.language == language]
+    return " ".join([libvoikko.Voikko.getVersion()] + sorted(dicts))
+
+
+class VoikkoPool(object):
+    """Pool of Voikko handles shared between threads.
+
+    A libvoikko handle must not be used by two threads at the same time.
+    Threads check out a handle for the duration of a call and return it
+    afterwards. New handles are created on demand until the pool reaches
+    its maximum size, after which threads wait for a free handle.
+    """
+
+    def __init__(self, language="fi", max_size=1, initial_size=1):
+        """Initialize the pool.
+
+        language (unicode): The Voikko language code.
+        max_size (int): Maximum number of handles.
+        initial_size (int): Number of handles created immediately.
+        RETURNS (VoikkoPool): The newly constructed object.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be positive, got {}".format(max_size))
+        self.language = language
+        self.max_size = max_size
+        self._idle = []
+        self._num_handles = 0
+        self._cond = threading.Condition()
+        for _ in range(min(initial_size, max_size)):
+            self._idle.append(self._create())
+            self._num_handles += 1
+
+    def __len__(self):
+        """RETURNS (int): The number of handles created so far."""
+        return self._num_handles
+
+    def acquire(self, timeout=None):
+        """Check out a handle, creating one if none is free and the pool is
+        not full.
+
+        timeout (float): Seconds to wait for a free handle. None waits
+            indefinitely.
+        RETURNS (libvoikko.Voikko): The handle. Must be returned with
+            `release`.
+        """
+        with self._cond:
+            while not self._idle:
+                if self._num_handles < self.max_size:
+                    self._num_handles += 1
+                    break
+                if not self._cond.wait(timeout):
+                    raise TimeoutError("No free Voikko handle")
+            else:
+                return self._idle.pop()
+
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._num_handles -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, voikko):
+        """Return a checked out handle to the pool.
+
+        voikko (libvoikko.Voikko): The handle.
+        """
+        with self._cond:
+            self._idle.append(voikko)
+            self._cond.notify()
+
+    @contextmanager
+    def handle(self, timeout=None):
+        """Check out a handle for the duration of a with block.
+
+        timeout (float): Seconds to wait for a free handle.
+        YIELDS (libvoikko.Voikko): The handle.
+        """
+        voikko = self.acquire(timeout)
+        try:
+            yield voikko
+        finally:
+            self.release(voikko)
+
+    def close(self):
+        """Terminate the idle handles. Handles that are checked out are
+        unaffected.
+        """
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+            self._num_handles -= len(idle)
+        for voikko in idle:
+            voikko.terminate()
+
+    def _create(self):
+        # Imported here to keep libvoikko out of the import time
+        from voikko import libvoikko
+
+        return libvoikko.Voikko(self.language)
@@ -0,0 +1,63 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+
+class SuffixRules(object):
+    """Suffix rewrite rules compiled into a trie of reversed suffixes.
+
+    The rules are in the format of spaCy's "lemma_rules" table: pairs of
+    (old suffix, new suffix). A lookup walks the string backwards once and
+    collects every rule whose suffix matches, so the cost depends on the
+    length of the longest matching suffix rather than the number of rules.
+    """
+
+    def __init__(self, rules, index=()):
+        """Compile the rules.
+
+        rules (iterable): Pairs of (old suffix, new suffix).
+        index (iterable): Known lemmas, e.g. the "lemma_index" entries of the
+            part-of-speech.
+        RETURNS (SuffixRules): The newly constructed object.
+        """
+        self.index = frozenset(index)
+        # Nodes map a character to a child node. The replacements of the
+        # suffix that ends at a node are stored under the key "".
+        self._root = {}
+        for old, new in rules:
+            node = self._root
+            for char in reversed(old):
+                node = node.setdefault(char, {})
+            node.setdefault("", []).append(new)
+
+    def __call__(self, string):
+        """Rewrite the suffixes of a string.
+
+        string (unicode): The string.
+        RETURNS (tuple): The lists of candidate forms that are in the index
+            (or are not alphabetic, like spaCy's rule lemmatizer accepts) and
+            of the other candidates. Longer suffix matches come first.
+        """
+        node = self._root
+        matches = []
+        if "" in node:
+            matches.append((0, node[""]))
+        for depth, char in enumerate(reversed(string), 1):
+            node = node.get(char)
+            if node is None:
+                break
+            if "" in node:
+                matches.append((depth, node[""]))
+
+        known = []
+        guesses = []
+        for depth, replacements in reversed(matches):
+            stem = string[:len(string) - depth]
+            for new in replacements:
+                form = stem + new
+                if not form:
+                    continue
+                elif form in self.index or not form.isalpha():
+                    known.append(form)
+                else:
+                    guesses.append(form)
+        return known, guesses
@@ -0,0 +1,234 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import os
+import signal
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import threading
+
+import plac
+import srsly
+
+from .lemmatizer import create_lemmatizer
+from .warmup import Warmup, ranked_pairs
+
+
+frame_header = struct.Struct(">I")
+
+
+def send_message(sock, message):
+    data = srsly.msgpack_dumps(message)
+    sock.sendall(frame_header.pack(len(data)) + data)
+
+
+def recv_message(sock, max_size=None):
+    """Read one message.
+
+    sock (socket): The connected socket.
+    max_size (int): Largest accepted message in bytes. A larger message
+        raises ValueError without being read.
+    RETURNS (dict): The message or None at EOF.
+    """
+    header = _recv_exactly(sock, frame_header.size)
+    if header is None:
+        return None
+    size = frame_header.unpack(header)[0]
+    if max_size is not None and size > max_size:
+        raise ValueError("Message of {} bytes exceeds the maximum of {} "
+                         "bytes".format(size, max_size))
+    data = _recv_exactly(sock, size)
+    if data is None:
+        raise ConnectionError("Connection closed in the middle of a message")
+    return srsly.msgpack_loads(data)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        lemmatizer = self.server.lemmatizer
+        while True:
+            try:
+                request = recv_message(self.request, self.server.max_message_size)
+            except ValueError as e:
+                # The rest of the message is not read, so the connection
+                # can't be used any more
+                send_message(self.request, {"error": "ValueError: {}".format(e)})
+                break
+            if request is None:
+                break
+            try:
+                lemmas = lemmatizer.lemmatize_many(
+                    (string, univ_pos) for string, univ_pos in request["pairs"])
+                response = {"lemmas": lemmas}
+            except Exception as e:
+                response = {"error": "{}: {}".format(type(e).__name__, e)}
+            send_message(self.request, response)
+
+
+class LemmatizerServer(socketserver.ThreadingUnixStreamServer):
+    """Serve lemmatization requests over a Unix socket.
+
+    Each connection is handled in a thread of its own. All connections
+    share one FinnishLemmatizer, and so its caches, and the Voikko handles
+    in its pool. Start a server from the command line with
+
+        python -m fi.server /tmp/fi-lemmatizer.sock --workers 4
+
+    Every message is a msgpack map preceded by its length as a 4-byte
+    big-endian integer. A request {"pairs": [[string, univ_pos], ...]} is
+    answered with {"lemmas": [[lemma, ...], ...]} or {"error": message}.
+    A request larger than `max_message_size` is answered with an error and
+    the connection is closed.
+    """
+
+    daemon_threads = True
+    max_message_size = 64 * 1024 * 1024
+
+    def __init__(self, path, lemmatizer=None, n_workers=4):
+        """Bind the socket.
+
+        path (unicode): Path of the Unix socket. A stale socket file is
+            replaced. A socket that a server is listening on, or another
+            kind of file, raises OSError.
+        lemmatizer (FinnishLemmatizer): The lemmatizer. By default one is
+            created with `n_workers` Voikko handles.
+        n_workers (int): Number of requests analyzed concurrently.
+        RETURNS (LemmatizerServer): The newly constructed object.
+        """
+        if lemmatizer is None:
+            lemmatizer = create_lemmatizer(voikko_pool_size=n_workers)
+        self.lemmatizer = lemmatizer
+        if _is_stale_socket(path):
+            os.unlink(path)
+        socketserver.ThreadingUnixStreamServer.__init__(self, path, _RequestHandler)
+
+    def server_bind(self):
+        socketserver.ThreadingUnixStreamServer.server_bind(self)
+        self._bound = True
+
+    def server_close(self):
+        socketserver.ThreadingUnixStreamServer.server_close(self)
+        # Not if binding failed, when the file belongs to someone else
+        if getattr(self, "_bound", False) and os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def _is_stale_socket(path):
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return False
+    except FileNotFoundError:
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except ConnectionRefusedError:
+        return True
+    finally:
+        sock.close()
+    return False
+
+
+class LemmatizerClient(object):
+    """Client for LemmatizerServer with the calling interface of
+    FinnishLemmatizer. A client can be shared between threads.
+    """
+
+    def __init__(self, path):
+        """Connect to a server.
+
+        path (unicode): Path of the server's Unix socket.
+        RETURNS (LemmatizerClient): The newly constructed object.
+        """
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+        self._lock = threading.Lock()
+
+    def __call__(self, string, univ_pos, morphology=None):
+        """Lemmatize a string.
+
+        string (unicode): The string to lemmatize, e.g. the token text.
+        univ_pos (unicode / int): The token's universal part-of-speech tag.
+        morphology (dict): Unused.
+        RETURNS (tuple): The available lemmas for the string.
+        """
+        return self.lemmatize_many([(string, univ_pos)])[0]
+
+    def lemmatize_many(self, pairs):
+        """Lemmatize a batch of strings in one request.
+
+        pairs (iterable): Tuples of (string, univ_pos).
+        RETURNS (list): The lemma tuples in the order of the input pairs.
+        """
+        request = {"pairs": [[string, univ_pos] for string, univ_pos in pairs]}
+        with self._lock:
+            send_message(self._sock, request)
+            response = recv_message(self._sock)
+        if response is None:
+            raise ConnectionError("The lemmatizer server closed the connection")
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return [tuple(lemmas) for lemmas in response["lemmas"]]
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@plac.annotations(
+    path=('Path of the Unix socket', 'positional'),
+    workers=('Number of concurrently used Voikko handles', 'option', 'w', int),
+    cache_size=('Number of cached lemmatization results', 'option', 'c', int),
+    warmup=('CoNLL-U file or frequency list whose words are lemmatized in the '
+            'background at startup', 'option', 'W', str),
+    warmup_seconds=('Time budget of the warm-up', 'option', 'T', float),
+)
+def main(path, workers=4, cache_size=1000000, warmup=None, warmup_seconds=None):
+    lemmatizer = create_lemmatizer(voikko_pool_size=workers,
+                                   result_cache_size=cache_size)
+    server = LemmatizerServer(path, lemmatizer)
+    if warmup is not None:
+        fmt = "conllu" if warmup.endswith(".conllu") else "freq"
+        Warmup(lemmatizer, ranked_pairs([warmup], fmt),
+               max_seconds=warmup_seconds, callback=_report_warmup).start()
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _report_warmup(progress):
+    if progress["entries"] % 10000 == 0:
+        print("Warm-up: {} entries in {:.1f} s".format(
+            progress["entries"], progress["seconds"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    plac.call(main)
@@ -0,0 +1,77 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import re
+import threading
+from collections import OrderedDict
+
+
+class ShapeClassifier(object):
+    """Recognize tokens whose lemma is the token itself from their shape,
+    so that they need not be analyzed.
+
+    Classes:
+        long: longer than `max_length` characters. Only the part after
+            the last hyphen counts, as only that part is analyzed.
+        number: digits, optionally with a sign, separators or a percent sign
+        url: web address
+        email: e-mail address
+        hashtag: hashtag or @-mention
+        emoji: emoji and pictographic symbols
+        acronym: two to five capital letters, optionally followed by digits.
+            Not enabled by default, because words written in all caps would
+            lose their lemmas.
+    """
+
+    patterns = OrderedDict([
+        ("number", r"[+-]?\d+(?:[.,:\u00a0\u202f ]\d+)*%?"),
+        ("url", r"(?:https?://|www\.)\S+"),
+        ("email", r"[^@\s]+@[^@\s]+\.\w+"),
+        ("hashtag", r"[#@]\w+"),
+        ("emoji", r"[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]+"),
+        ("acronym", r"[A-ZÅÄÖ]{2,5}\d*"),
+    ])
+    default_classes = ("long", "number", "url", "email", "hashtag", "emoji")
+
+    def __init__(self, classes=default_classes, max_length=64):
+        """Initialize the classifier.
+
+        classes (iterable): Names of the enabled classes.
+        max_length (int): Tokens whose last hyphen-separated part is longer
+            than this belong to the class "long", if it is enabled.
+        RETURNS (ShapeClassifier): The newly constructed object.
+        """
+        classes = set(classes)
+        unknown = classes - set(self.patterns) - {"long"}
+        if unknown:
+            raise ValueError("Unknown token shapes: {}".format(sorted(unknown)))
+        self.classes = tuple(sorted(classes))
+        self.max_length = max_length if "long" in classes else None
+        alternatives = ["(?P<{}>{})".format(name, pattern)
+                        for name, pattern in self.patterns.items()
+                        if name in classes]
+        if alternatives:
+            self._regex = re.compile("|".join(alternatives))
+        else:
+            self._regex = None
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, string):
+        """Classify a token.
+
+        string (unicode): The token text.
+        RETURNS (unicode): The name of the matching class or None.
+        """
+        if (self.max_length is not None and len(string) > self.max_length and
+                len(string.rpartition("-")[2]) > self.max_length):
+            shape = "long"
+        else:
+            match = self._regex.fullmatch(string) if self._regex else None
+            if match is None:
+                return None
+            shape = match.lastgroup
+
+        with self._lock:
+            self.counts[shape] = self.counts.get(shape, 0) + 1
+        return shape
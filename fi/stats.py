@@ -0,0 +1,95 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import threading
+from collections import deque
+
+
+class LemmatizerStats(object):
+    """Counters and timers for the stages of FinnishLemmatizer.
+
+    Timed stages:
+        analyze: Voikko analysis
+        baseform: deriving (lemma, part-of-speech) pairs from the analyses,
+            including fst
+        fst: parsing FSTOUTPUT and WORDBASES
+        exceptions: merging the exception lemmas
+        lemmatize: lemmatizing a string that was not in the result cache
+        tier.NAME: each tier of the resolution chain, see TierChain
+
+    The counters record the number of lemmatized tokens and how often each
+    branch of the lemmatizer is taken: "branch.minen", "branch.participle",
+    "branch.agent_participle", "branch.kerrontosti", "branch.itse",
+    "branch.baseform", "branch.unknown_class", "adv_normalize", "hyphen",
+    "lemma_dict", "exception_store", "suffix_rules", "oov" (no analyses)
+    and "oov_fallback" (the string is returned as its own lemma). The hits
+    and misses of each tier are counted as "tier.NAME.hit" and
+    "tier.NAME.miss".
+    """
+
+    def __init__(self, callback=None, interval=10000, slow_threshold=None,
+                 max_slow=100):
+        """Initialize the statistics.
+
+        callback (callable): Called with `snapshot()` after every `interval`
+            tokens, e.g. to forward the numbers to a metrics system.
+        interval (int): Number of tokens between callback calls.
+        slow_threshold (float): Record the strings whose lemmatization takes
+            longer than this many seconds.
+        max_slow (int): Number of most recent slow strings kept.
+        RETURNS (LemmatizerStats): The newly constructed object.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.counts = {}
+        self.times = {}
+        self.slow = deque(maxlen=max_slow)
+        self._lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.times[stage] = self.times.get(stage, 0.0) + seconds
+
+    def add_step(self, stage, seconds, counter):
+        """Record the time of a stage and increment a counter together."""
+        with self._lock:
+            self.times[stage] = self.times.get(stage, 0.0) + seconds
+            self.counts[counter] = self.counts.get(counter, 0) + 1
+
+    def add_lemmatized(self, string, univ_pos, seconds):
+        """Record the time to lemmatize a string."""
+        self.add_time("lemmatize", seconds)
+        if self.slow_threshold is not None and seconds > self.slow_threshold:
+            self.slow.append((string, univ_pos, seconds))
+
+    def tick(self):
+        """Count a lemmatized token and run the callback if it is due."""
+        with self._lock:
+            tokens = self.counts.get("tokens", 0) + 1
+            self.counts["tokens"] = tokens
+        if self.callback is not None and tokens % self.interval == 0:
+            self.callback(self.snapshot())
+
+    def snapshot(self):
+        """Copy the current statistics.
+
+        RETURNS (dict): The counts, the cumulative times in seconds per
+            stage and the recorded slow strings.
+        """
+        with self._lock:
+            return {
+                "counts": dict(self.counts),
+                "times": dict(self.times),
+                "slow": list(self.slow),
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+            self.times.clear()
+            self.slow.clear()
@@ -0,0 +1,254 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from time import perf_counter
+
+
+class Tier(object):
+    """A step of the lemma resolution chain of FinnishLemmatizer.
+
+    `lookup` is called with the lemmatizer, the string, the normalized
+    part-of-speech and the lemma tables. It returns the lemmas, which ends
+    the chain, or None to pass the string on to the next tier.
+    """
+
+    name = None
+    # Whether the answers are stored in the result cache, if the "cache"
+    # tier comes earlier in the chain
+    cacheable = True
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        raise NotImplementedError
+
+
+class CacheTier(Tier):
+    """Lemmas cached in the result cache."""
+
+    name = "cache"
+    cacheable = False
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        cache = lemmatizer.result_cache
+        if cache is None:
+            return None
+        return cache.get((string, univ_pos))
+
+
+class ShapeTier(Tier):
+    """Numbers, URLs and other tokens that are their own lemmas. Not cached,
+    so that unique numbers and such don't evict words.
+    """
+
+    name = "shape"
+    cacheable = False
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        shapes = lemmatizer.shapes
+        if shapes is not None and shapes(string) is not None:
+            return (string,)
+        return None
+
+
+class LookupTier(Tier):
+    """Precompiled lemmas of the lemma_dict."""
+
+    name = "lookup"
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        if lemmatizer.lemma_dict is None:
+            return None
+        lemmas = lemmatizer.lemma_dict.get(string, univ_pos)
+        if lemmas is not None:
+            lemmatizer._count("lemma_dict")
+        return lemmas
+
+
+class StoreTier(Tier):
+    """Lemmas of an authoritative exception store. Returns the same lemmas
+    as the analysis would, without analyzing the string.
+    """
+
+    name = "store"
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        store = lemmatizer.exception_store
+        if store is None or not store.authoritative:
+            return None
+        prefix, hyphen, last = string.rpartition("-")
+        lemmas = store.get(last, univ_pos)
+        if lemmas is None:
+            return None
+        lemmatizer._count("exception_store")
+        if hyphen:
+            return (prefix + hyphen + lemmas[0],)
+        return lemmas
+
+
+class ExceptionsTier(Tier):
+    """Lemmas of any exception store and of the "lemma_exc" table, without
+    analyzing the string. The lemmas Voikko would add to the exceptions are
+    left out, so this trades accuracy for throughput.
+    """
+
+    name = "exceptions"
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        prefix, hyphen, last = string.rpartition("-")
+        lower = last.lower()
+        store = lemmatizer.exception_store
+        stored = store.get(lower, univ_pos) if store is not None else None
+        if stored is not None and store.authoritative:
+            lemmas = stored
+        else:
+            exception_list = list(stored or ())
+            if tables[1]:
+                exception_list.extend(tables[1].get(univ_pos, {}).get(lower, ()))
+            if not exception_list:
+                return None
+            # In the order lemmatize_compound puts them in front of the forms
+            lemmas = tuple(reversed(list(OrderedDict.fromkeys(exception_list))))
+
+        if hyphen:
+            return (prefix + hyphen + lemmas[0],)
+        return lemmas
+
+
+class VoikkoTier(Tier):
+    """Voikko analysis merged with the exceptions, with the suffix rules and
+    the string itself as fallbacks. Always answers.
+    """
+
+    name = "voikko"
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        return lemmatizer._timed_lemmatize_pos(string, univ_pos, tables)
+
+
+class RulesTier(Tier):
+    """Lemmas guessed with the "lemma_rules" suffix rules, without analyzing
+    the string. Answers if a rule matches.
+    """
+
+    name = "rules"
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        index_table, _, rules_table = (t or {} for t in tables)
+        rules = lemmatizer._compiled_rules(univ_pos, index_table, rules_table)
+        if rules is None:
+            return None
+        prefix, hyphen, last = string.rpartition("-")
+        known, guesses = rules(last)
+        if not known and not guesses:
+            return None
+        lemmatizer._count("suffix_rules")
+        lemmas = tuple(OrderedDict.fromkeys(known + guesses))
+        if hyphen:
+            return (prefix + hyphen + lemmas[0],)
+        return lemmas
+
+
+tier_classes = OrderedDict((cls.name, cls) for cls in (
+    CacheTier, ShapeTier, LookupTier, StoreTier, ExceptionsTier, VoikkoTier,
+    RulesTier,
+))
+default_tiers = ("cache", "shape", "lookup", "store", "voikko")
+
+
+def register_tier(cls):
+    """Register a custom tier class by its name, so that chains naming it
+    can be built and lemmatizers using it can be loaded from bytes or disk.
+    Can be used as a class decorator.
+
+    cls (type): The Tier subclass. It is created without arguments.
+    RETURNS (type): The class.
+    """
+    tier_classes[cls.name] = cls
+    return cls
+
+
+class TierChain(object):
+    """Ordered tiers that resolve the lemmas of a string.
+
+    Each tier answers or passes the string on to the next one. Answers of
+    the tiers after "cache" are stored in the result cache. If no tier
+    answers, the string is its own lemma.
+
+    With statistics enabled, the hits and misses of each tier are counted
+    as "tier.NAME.hit" and "tier.NAME.miss", and the time spent in each
+    tier is recorded as the stage "tier.NAME".
+
+    Custom tiers subclass Tier. A lemmatizer is serialized with the names
+    of its tiers, so custom tiers must be registered with `register_tier`
+    to be loaded with `from_bytes` or `from_disk`. Pickling keeps the Tier
+    objects themselves.
+    """
+
+    def __init__(self, tiers=default_tiers):
+        """Build the chain.
+
+        tiers (iterable): Tiers in order, as Tier objects or the names of
+            registered tiers. The built-in tiers are "cache", "shape",
+            "lookup", "store", "exceptions", "voikko" and "rules".
+        RETURNS (TierChain): The newly constructed object.
+        """
+        self.tiers = []
+        for tier in tiers:
+            if not isinstance(tier, Tier):
+                if tier not in tier_classes:
+                    raise ValueError("Unknown tier: {}. Custom tiers must be "
+                                     "registered with register_tier".format(tier))
+                tier = tier_classes[tier]()
+            self.tiers.append(tier)
+
+        # (lookup method, whether the answers are cached, stats keys) in order
+        self._steps = []
+        cache_seen = False
+        for tier in self.tiers:
+            keys = ("tier." + tier.name, "tier." + tier.name + ".hit",
+                    "tier." + tier.name + ".miss")
+            self._steps.append((tier.lookup, cache_seen and tier.cacheable, keys))
+            cache_seen = cache_seen or tier.name == "cache"
+        self._is_default = [type(tier) for tier in self.tiers] == \
+            [tier_classes[name] for name in default_tiers]
+
+    @property
+    def is_default(self):
+        """RETURNS (bool): Whether the chain has the built-in tiers in the
+            default order.
+        """
+        return self._is_default
+
+    @property
+    def names(self):
+        """RETURNS (list): The names of the tiers in order."""
+        return [tier.name for tier in self.tiers]
+
+    def resolve(self, lemmatizer, string, univ_pos, tables):
+        """Resolve the lemmas of a string.
+
+        lemmatizer (FinnishLemmatizer): The lemmatizer.
+        string (unicode): The string.
+        univ_pos (unicode): The normalized part-of-speech.
+        tables (tuple): The "lemma_index", "lemma_exc" and "lemma_rules"
+            tables or None for missing tables.
+        RETURNS (tuple): The lemmas.
+        """
+        stats = lemmatizer.stats
+        if stats is not None:
+            t0 = perf_counter()
+        for lookup, cached, keys in self._steps:
+            lemmas = lookup(lemmatizer, string, univ_pos, tables)
+            if stats is not None:
+                t1 = perf_counter()
+                stats.add_step(keys[0], t1 - t0,
+                               keys[2] if lemmas is None else keys[1])
+                t0 = t1
+
+            if lemmas is not None:
+                if cached and lemmatizer.result_cache is not None:
+                    lemmatizer.result_cache.set((string, univ_pos), lemmas)
+                return lemmas
+
+        lemmatizer._count("oov_fallback")
+        return (string,)
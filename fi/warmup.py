@@ -0,0 +1,118 @@
+# coding: utf8
+from __future__ import unicode_literals
+
+import threading
+from itertools import islice
+from time import perf_counter
+
+from .corpus import count_pairs
+
+
+def ranked_pairs(paths, fmt="conllu"):
+    """Rank the (form, upos) pairs of CoNLL-U files or frequency lists by
+    frequency.
+
+    paths (iterable): Paths of the input files.
+    fmt (unicode): Input format, "conllu" or "freq".
+    RETURNS (list): The (form, upos) pairs, most frequent first.
+    """
+    counts = count_pairs(paths, fmt)
+    return sorted(counts, key=lambda pair: -counts[pair])
+
+
+class Warmup(object):
+    """Fill the caches of a lemmatizer by lemmatizing frequent words before
+    they are requested, either in the calling thread or in the background
+    while the lemmatizer already serves requests.
+    """
+
+    def __init__(self, lemmatizer, pairs, max_entries=None, max_seconds=None,
+                 batch_size=100, callback=None):
+        """Initialize the warm-up.
+
+        lemmatizer (FinnishLemmatizer): The lemmatizer to warm up.
+        pairs (iterable): Tuples of (string, univ_pos), most frequent first,
+            e.g. from `ranked_pairs`.
+        max_entries (int): Maximum number of pairs lemmatized. Defaults to
+            the size of the result cache, because further pairs would evict
+            the more frequent ones.
+        max_seconds (float): Stop after this many seconds.
+        batch_size (int): Number of pairs lemmatized between the checks of
+            the time budget.
+        callback (callable): Called with `progress()` after every batch.
+        RETURNS (Warmup): The newly constructed object.
+        """
+        if max_entries is None and lemmatizer.result_cache is not None:
+            max_entries = lemmatizer.result_cache.max_size
+        self.lemmatizer = lemmatizer
+        self.pairs = pairs
+        self.max_entries = max_entries
+        self.max_seconds = max_seconds
+        self.batch_size = batch_size
+        self.callback = callback
+        self.entries = 0
+        self.seconds = 0.0
+        self.finished = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def run(self):
+        """Warm up in the calling thread.
+
+        RETURNS (int): The number of lemmatized pairs.
+        """
+        start = perf_counter()
+        pairs = iter(self.pairs)
+        if self.max_entries is not None:
+            pairs = islice(pairs, self.max_entries)
+        try:
+            while not self._stopped:
+                if self.max_seconds is not None and self.seconds >= self.max_seconds:
+                    break
+                batch = list(islice(pairs, self.batch_size))
+                if not batch:
+                    break
+                self.lemmatizer.lemmatize_many(batch)
+                self.entries += len(batch)
+                self.seconds = perf_counter() - start
+                if self.callback is not None:
+                    self.callback(self.progress())
+        finally:
+            self.finished.set()
+        return self.entries
+
+    def start(self):
+        """Warm up in a background thread.
+
+        RETURNS (Warmup): This object.
+        """
+        self._thread = threading.Thread(target=self.run, name="fi-warmup")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop after the current batch."""
+        self._stopped = True
+
+    def wait(self, timeout=None):
+        """Wait for the warm-up to finish.
+
+        timeout (float): Maximum number of seconds to wait.
+        RETURNS (bool): Whether the warm-up has finished.
+        """
+        return self.finished.wait(timeout)
+
+    def progress(self):
+        """Report the progress of the warm-up.
+
+        RETURNS (dict): The number of lemmatized pairs, the number of pairs
+            allowed by the entry budget, the elapsed seconds and whether the
+            warm-up has finished.
+        """
+        return {
+            "entries": self.entries,
+            "max_entries": self.max_entries,
+            "seconds": self.seconds,
+            "finished": self.finished.is_set(),
+        }
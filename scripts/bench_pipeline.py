@@ -0,0 +1,89 @@
+# Compare setting lemmas token by token with the batched pipeline component
+#
+# python scripts/bench_pipeline.py data/UD_Finnish-TDT/fi_tdt-ud-dev.conllu
+#
+# The Docs are built from the CoNLL-U words and UPOS tags. Each method runs
+# twice with a fresh lemmatizer: first with empty caches, then warm.
+
+import io
+import time
+
+import numpy
+import plac
+import spacy
+from spacy.attrs import POS
+from spacy.parts_of_speech import IDS
+from spacy.tokens import Doc
+
+from fi.lemmatizer import create_lemmatizer
+from fi.pipeline import LemmatizerComponent
+
+
+def read_sentences(paths):
+    sentences = []
+    for path in paths:
+        words = []
+        with io.open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    if words:
+                        sentences.append(words)
+                    words = []
+                elif not line.startswith('#'):
+                    columns = line.split('\t')
+                    if '-' not in columns[0] and '.' not in columns[0]:
+                        words.append((columns[1], columns[3]))
+        if words:
+            sentences.append(words)
+    return sentences
+
+
+def make_docs(vocab, sentences):
+    docs = []
+    for words in sentences:
+        doc = Doc(vocab, words=[form for form, _ in words])
+        pos = numpy.array([IDS.get(upos, 0) for _, upos in words], dtype='uint64')
+        doc.from_array([POS], pos.reshape((-1, 1)))
+        docs.append(doc)
+    return docs
+
+
+def per_token(lemmatizer, docs):
+    for doc in docs:
+        for token in doc:
+            token.lemma_ = lemmatizer(token.text, token.pos)[0]
+
+
+def component(lemmatizer, docs, batch_size):
+    for _ in LemmatizerComponent(lemmatizer).pipe(docs, batch_size=batch_size):
+        pass
+
+
+@plac.annotations(
+    inputs=('CoNLL-U files', 'positional', None, str),
+    batch_size=('Number of Docs per component batch', 'option', 'b', int),
+)
+def main(batch_size=1000, *inputs):
+    vocab = spacy.blank('fi').vocab
+    sentences = read_sentences(inputs)
+    num_tokens = sum(len(words) for words in sentences)
+    methods = {
+        'per_token': per_token,
+        'component': lambda l, docs: component(l, docs, batch_size),
+    }
+
+    print('method\tcold tokens/s\twarm tokens/s')
+    for name, method in methods.items():
+        lemmatizer = create_lemmatizer()
+        rates = []
+        for _ in range(2):
+            docs = make_docs(vocab, sentences)
+            start = time.perf_counter()
+            method(lemmatizer, docs)
+            rates.append(num_tokens / (time.perf_counter() - start))
+        print(f'{name}\t{rates[0]:.0f}\t{rates[1]:.0f}')
+
+
+if __name__ == '__main__':
+    plac.call(main)
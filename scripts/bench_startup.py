@@ -0,0 +1,73 @@
+# Measure the import, construction and first call times of the lemmatizer
+#
+# Each measurement runs in a fresh Python process:
+# python scripts/bench_startup.py --repeats 10
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import plac
+
+
+CHILD = '''
+import json, sys, time
+t0 = time.perf_counter()
+from fi.lemmatizer import create_lemmatizer
+t1 = time.perf_counter()
+lemmatizer = create_lemmatizer(**json.loads(sys.argv[1]))
+t2 = time.perf_counter()
+lemmatizer('taloissa', 'NOUN')
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'create': t2 - t1, 'first_call': t3 - t2}))
+'''
+
+
+def measure(kwargs, repeats):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [p for p in [env.get('PYTHONPATH')] if p])
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD, json.dumps(kwargs)],
+            env=env, check=True, stdout=subprocess.PIPE)
+        runs.append(json.loads(out.stdout))
+    return {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+
+
+@plac.annotations(
+    repeats=('Number of processes started per mode', 'option', 'n', int),
+    output=('Write the results as JSON to this file', 'option', 'o', str),
+)
+def main(repeats=5, output=None):
+    from fi.lemmatizer import save_lookups_snapshot
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        snapshot = os.path.join(tmpdir, 'lookups.bin')
+        save_lookups_snapshot(snapshot)
+        modes = {
+            'eager': {},
+            'lazy': {'lazy': True},
+            'snapshot': {'snapshot': snapshot},
+            'lazy+snapshot': {'lazy': True, 'snapshot': snapshot},
+        }
+        results = {name: measure(kwargs, repeats)
+                   for name, kwargs in modes.items()}
+
+    print('mode\timport ms\tcreate ms\tfirst call ms')
+    for name, r in results.items():
+        print(f'{name}\t{r["import"]*1000:.1f}\t{r["create"]*1000:.1f}\t'
+              f'{r["first_call"]*1000:.1f}')
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,204 @@
+# Benchmark lemmatizer throughput, latency and cache behaviour
+#
+# python scripts/benchmark.py data/UD_Finnish-TDT/fi_tdt-ud-dev.conllu \
+#     --output bench.json --baseline bench_baseline.json
+#
+# Every scenario runs in a fresh process on two token streams: the CoNLL-U
+# tokens in corpus order, and a synthetic stream sampled from the corpus
+# vocabulary with Zipfian frequencies. Throughput and latency are measured
+# with statistics disabled; the Voikko and post-processing times come from a
+# second, instrumented pass. The exit status is 1 if a scenario is slower
+# than in the baseline by more than the tolerance.
+
+import io
+import json
+import random
+import resource
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import plac
+from fi.corpus import iter_conllu_tokens
+from fi.lemmatizer import create_lemmatizer
+
+
+SCENARIOS = {
+    'cached': {},
+    'uncached': {'analysis_cache_size': 0, 'result_cache_size': 0},
+    'batch': {},
+    # Full lemma lists and the best lemma only, on analysis-cached input
+    'lists': {'result_cache_size': 0},
+    'best': {'result_cache_size': 0},
+}
+
+
+def read_streams(inputs, zipf_tokens, zipf_exponent, max_tokens, seed=0):
+    tokens = []
+    for path in inputs:
+        with io.open(path, encoding='utf-8') as f:
+            tokens.extend(iter_conllu_tokens(f))
+    if max_tokens:
+        tokens = tokens[:max_tokens]
+
+    counts = {}
+    for pair in tokens:
+        counts[pair] = counts.get(pair, 0) + 1
+    vocab = sorted(counts, key=lambda x: -counts[x])
+    weights = [1.0 / (rank ** zipf_exponent) for rank in range(1, len(vocab) + 1)]
+    zipf = random.Random(seed).choices(vocab, weights, k=zipf_tokens)
+
+    return {'corpus': tokens, 'zipf': zipf}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def lemmatize_pairs(lemmatizer, name, pairs, on_token):
+    lemmatize = lemmatizer.lemmatize_best if name == 'best' else lemmatizer
+    if name == 'batch':
+        for _ in lemmatizer.lemmatize_stream(pairs):
+            pass
+        return
+
+    for word, upos in pairs:
+        t0 = perf_counter()
+        lemmatize(word, upos)
+        on_token(upos, perf_counter() - t0)
+
+
+def measure(name, pairs):
+    # Throughput and latency, without the overhead of the statistics
+    lemmatizer = create_lemmatizer(**SCENARIOS[name])
+    latencies = []
+    start = perf_counter()
+    lemmatize_pairs(lemmatizer, name, pairs,
+                    lambda upos, elapsed: latencies.append(elapsed))
+    total = perf_counter() - start
+
+    result = {}
+    if name != 'batch':
+        latencies.sort()
+        result['p50_us'] = percentile(latencies, 50) * 1e6
+        result['p99_us'] = percentile(latencies, 99) * 1e6
+    result['tokens'] = len(pairs)
+    result['seconds'] = total
+    result['tokens_per_sec'] = len(pairs) / total if total else 0.0
+    if lemmatizer.analysis_cache is not None:
+        result['analysis_cache'] = lemmatizer.analysis_cache.stats()
+    if lemmatizer.result_cache is not None:
+        result['result_cache'] = lemmatizer.result_cache.stats()
+    return result
+
+
+def profile(name, pairs):
+    # Time split between Voikko and post-processing, in a separate
+    # instrumented pass
+    lemmatizer = create_lemmatizer(stats=True, **SCENARIOS[name])
+    times = lemmatizer.stats.times
+    by_pos = {}
+    analyzed = [0.0]
+
+    def on_token(upos, elapsed):
+        analyze = times.get('analyze', 0.0) - analyzed[0]
+        analyzed[0] += analyze
+        stats = by_pos.setdefault(upos, {'tokens': 0, 'analyze_s': 0.0,
+                                         'postprocess_s': 0.0})
+        stats['tokens'] += 1
+        stats['analyze_s'] += analyze
+        stats['postprocess_s'] += elapsed - analyze
+
+    start = perf_counter()
+    lemmatize_pairs(lemmatizer, name, pairs, on_token)
+    total = perf_counter() - start
+
+    result = {}
+    if name != 'batch':
+        result['by_pos'] = by_pos
+    result['analyze_s'] = times.get('analyze', 0.0)
+    result['postprocess_s'] = total - result['analyze_s']
+    result['stages'] = lemmatizer.stats.snapshot()
+    return result
+
+
+def run_scenario(name, pairs):
+    result = measure(name, pairs)
+    result.update(profile(name, pairs))
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+
+        ratio = result['tokens_per_sec'] / base['tokens_per_sec']
+        print(f'{key}\tthroughput {ratio:.2f}x baseline')
+        if ratio < 1 - tolerance:
+            regressions.append(f'{key}: throughput {ratio:.2f}x baseline')
+        if 'p99_us' in result and base.get('p99_us'):
+            ratio = result['p99_us'] / base['p99_us']
+            if ratio > 1 + tolerance:
+                regressions.append(f'{key}: p99 latency {ratio:.2f}x baseline')
+    return regressions
+
+
+@plac.annotations(
+    inputs=('CoNLL-U files', 'positional', None, str),
+    output=('Write the results as JSON to this file', 'option', 'o', str),
+    baseline=('Compare against results stored in this JSON file',
+              'option', 'b', str),
+    tolerance=('Allowed relative slowdown compared to the baseline',
+               'option', 't', float),
+    zipf_tokens=('Length of the synthetic Zipfian stream', 'option', 'z', int),
+    zipf_exponent=('Exponent of the Zipfian distribution', 'option', 's', float),
+    max_tokens=('Use at most this many corpus tokens', 'option', 'n', int),
+    scenarios=('Comma-separated scenarios to run', 'option', 'c', str),
+)
+def main(output=None, baseline=None, tolerance=0.1, zipf_tokens=100000,
+         zipf_exponent=1.0, max_tokens=None, scenarios=','.join(SCENARIOS),
+         *inputs):
+    if not inputs:
+        sys.exit('At least one CoNLL-U file is required')
+
+    streams = read_streams(inputs, zipf_tokens, zipf_exponent, max_tokens)
+    results = {}
+    for name in scenarios.split(','):
+        for stream_name, pairs in streams.items():
+            # A fresh process per run keeps caches and peak RSS separate
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_scenario, name, pairs).result()
+
+            key = f'{name}/{stream_name}'
+            results[key] = result
+            latency = ''
+            if 'p50_us' in result:
+                latency = (f', p50 {result["p50_us"]:.1f} us, '
+                           f'p99 {result["p99_us"]:.1f} us')
+            print(f'{key}\t{result["tokens_per_sec"]:.0f} tokens/s{latency}, '
+                  f'voikko {result["analyze_s"]:.2f} s, '
+                  f'other {result["postprocess_s"]:.2f} s, '
+                  f'peak RSS {result["peak_rss_kb"] / 1024:.0f} MB')
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(results, json.load(f), tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    plac.call(main)
@@ -0,0 +1,46 @@
+# Build a precompiled lemma dictionary from CoNLL-U data or a frequency list
+#
+# python scripts/build_lemma_dict.py data/fi_lemmas.bin data/UD_Finnish-TDT/*.conllu
+#
+# Load the dictionary with create_lemmatizer(lemma_dict='data/fi_lemmas.bin')
+
+import plac
+from fi.corpus import count_pairs
+from fi.lemmatizer import create_lemmatizer
+from fi.lexicon import LemmaTable
+
+
+@plac.annotations(
+    output=('Output file', 'positional'),
+    inputs=('CoNLL-U files or frequency lists', 'positional', None, str),
+    fmt=('Input format', 'option', 'f', str, ['conllu', 'freq']),
+    min_count=('Include only pairs occurring at least this many times',
+               'option', 'c', int),
+    max_entries=('Include at most this many most frequent pairs',
+                 'option', 'n', int),
+)
+def main(output, fmt='conllu', min_count=1, max_entries=None, *inputs):
+    lemmatizer = create_lemmatizer(result_cache_size=0)
+    counts = {}
+    for (form, upos), count in count_pairs(inputs, fmt).items():
+        if upos == 'AUX':
+            upos = 'VERB'
+        univ_pos = lemmatizer.univ_pos_names.get(upos)
+        if univ_pos is None or univ_pos == 'punct':
+            continue
+
+        key = (form, univ_pos)
+        counts[key] = counts.get(key, 0) + count
+
+    pairs = sorted((k for k, v in counts.items() if v >= min_count),
+                   key=lambda k: -counts[k])
+    if max_entries is not None:
+        pairs = pairs[:max_entries]
+
+    lemmas = lemmatizer.lemmatize_many(pairs)
+    LemmaTable.write(output, zip(pairs, lemmas))
+    print(f'Wrote {len(pairs)} entries to {output}')
+
+
+if __name__ == '__main__':
+    plac.call(main)
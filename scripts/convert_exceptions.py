@@ -0,0 +1,25 @@
+# Convert lemma exceptions from the JSON lookups format into a memory-mapped
+# exception store
+#
+# python scripts/convert_exceptions.py lookups/fi_lemma_exc.json data/fi_exc.bin
+#
+# Load the store with create_lemmatizer(exception_store='data/fi_exc.bin')
+
+import plac
+from fi.lexicon import ExceptionStore
+
+
+@plac.annotations(
+    input=('JSON file: part-of-speech -> word -> list of lemmas', 'positional'),
+    output=('Output file', 'positional'),
+    authoritative=('Return the exceptions without analyzing the word',
+                   'flag', 'a'),
+)
+def main(input, output, authoritative=False):
+    ExceptionStore.from_json(input, output, authoritative)
+    store = ExceptionStore(output)
+    print(f'Wrote {len(store)} exceptions to {output}')
+
+
+if __name__ == '__main__':
+    plac.call(main)
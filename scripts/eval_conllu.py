@@ -1,42 +1,100 @@
 # Evaluate the lemmatizer on conllu data file printing mismatched lemmas
+#
+# python scripts/eval_conllu.py < data/UD_Finnish-TDT/fi_tdt-ud-train.conllu
+# python scripts/eval_conllu.py -n 8 -s data/UD_Finnish-TDT/*.conllu
 
+import io
 import sys
+import time
+
+import plac
 from fi.lemmatizer import create_lemmatizer
+from fi.parallel import ParallelLemmatizer
+
+
+def read_words(lines, counts):
+    """Count the (word, upos, lemma) triples and return the number of words"""
+    num_words = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+
+        num_words += 1
+        columns = line.split('\t')
+        key = (columns[1], columns[3], columns[2])
+        counts[key] = counts.get(key, 0) + 1
+    return num_words
+
 
+@plac.annotations(
+    inputs=('CoNLL-U files. Reads stdin if none are given',
+            'positional', None, str),
+    n_process=('Number of worker processes', 'option', 'n', int),
+    summary_only=('Print only the error counts, not every mismatch',
+                  'flag', 's'),
+)
+def main(n_process=1, summary_only=False, *inputs):
+    start = time.perf_counter()
+    num_words = 0
+    counts = {}
+    if inputs:
+        for path in inputs:
+            with io.open(path, encoding='utf-8') as f:
+                num_words += read_words(f, counts)
+    else:
+        num_words += read_words(sys.stdin, counts)
 
-num_words = 0
-errors = {}
-lemmatizer = create_lemmatizer()
-for line in sys.stdin:
-    line = line.strip()
-    if not line or line.startswith('#'):
-        continue
-
-    num_words += 1
-    columns = line.split('\t')
-    word = columns[1]
-    expected = [
-        columns[2].replace('#', '').lower(),
-        columns[2].replace('#', '-').lower()
-    ]
-    upos = columns[3]
-    if upos == 'AUX':
-        upos = 'VERB'
-    if upos in ['NOUN', 'VERB', 'ADJ', 'ADV', 'PROPN', 'ADP']:
-        observed = lemmatizer(word.strip('-'), upos)
+    # Lemmatize each distinct (word, upos) pair once
+    evaluated = []
+    pairs = {}
+    for key in counts:
+        word, upos, lemma = key
+        if upos == 'AUX':
+            upos = 'VERB'
+        if upos in ['NOUN', 'VERB', 'ADJ', 'ADV', 'PROPN', 'ADP']:
+            pair = (word.strip('-'), upos)
+            evaluated.append((key, pair))
+            pairs[pair] = None
+
+    if n_process > 1:
+        with ParallelLemmatizer(n_process) as lemmatizer:
+            lemmas = lemmatizer.lemmatize_many(pairs)
+    else:
+        lemmas = create_lemmatizer().lemmatize_many(pairs)
+    observed_lemmas = dict(zip(pairs, lemmas))
+
+    errors = {}
+    for key, pair in evaluated:
+        word, _, lemma = key
+        upos = pair[1]
+        expected = [
+            lemma.replace('#', '').lower(),
+            lemma.replace('#', '-').lower()
+        ]
+        observed = observed_lemmas[pair]
 
         if observed and observed[0].lower() not in expected:
-            if upos not in errors:
-                errors[upos] = 0
-            errors[upos] += 1
+            count = counts[key]
+            errors[upos] = errors.get(upos, 0) + count
+
+            if not summary_only:
+                repeated = f' [{count}x]' if count > 1 else ''
+                print(f'{word} ({upos}): {observed[0]} != {expected[0]}{repeated}')
+
+    elapsed = time.perf_counter() - start
+
+    print()
+    print('Error counts by POS tag:')
 
-            print(f'{word} ({upos}): {observed[0]} != {expected[0]}')
+    for upos, count in sorted(errors.items(), key=lambda x: -x[1]):
+        print(f'{upos}\t{count}')
 
-print()
-print('Error counts by POS tag:')
+    total_errors = sum(errors.values())
+    print(f'Total\t{total_errors}, proportion: {total_errors/num_words*100:.1f} %')
+    print(f'{num_words} words ({len(pairs)} distinct) in {elapsed:.1f} s, '
+          f'{num_words/elapsed:.0f} words/s')
 
-for upos, count in sorted(errors.items(), key=lambda x: -x[1]):
-    print(f'{upos}\t{count}')
 
-total_errors = sum(errors.values())
-print(f'Total\t{total_errors}, proportion: {total_errors/num_words*100:.1f} %')
+if __name__ == '__main__':
+    plac.call(main)
@@ -1,5 +1,23 @@
-from fi.lemmatizer import create_lemmatizer
+from fi.aio import AsyncLemmatizer
+from fi.analysis import FstRecord
+from fi.columnar import lemmatize_array
+from fi.lemmatizer import FinnishLemmatizer, create_lemmatizer
+from fi.lexicon import ExceptionStore, LemmaTable
+from fi.rules import SuffixRules
+from fi.shapes import ShapeClassifier
+from fi.server import LemmatizerClient, LemmatizerServer
+from fi.tiers import Tier, register_tier
 from itertools import chain
+import asyncio
+import json
+import numpy
+import os
+import pickle
+import random
+import re
+import tempfile
+import threading
+from spacy.lookups import Lookups
 
 
 def check(cases, accept_less_common=True):
@@ -23,6 +41,435 @@ def check(cases, accept_less_common=True):
     return errors/len(expanded)
 
 
+def check_batch(cases):
+    lemmatizer = create_lemmatizer()
+    pairs = [(word, pos) for pos, words in cases.items() for word, _ in words]
+    expected = [lemmatizer(word, pos) for word, pos in pairs]
+
+    errors = 0
+    if lemmatizer.lemmatize_many(pairs + pairs) != expected + expected:
+        errors += 1
+        print('lemmatize_many() differs from __call__()')
+    if list(lemmatizer.lemmatize_stream(pairs, batch_size=10)) != expected:
+        errors += 1
+        print('lemmatize_stream() differs from __call__()')
+    uncached = create_lemmatizer(result_cache_size=0)
+    if [uncached.lemmatize_best(word, pos) for word, pos in pairs] != \
+       [lemmas[0] for lemmas in expected]:
+        errors += 1
+        print('lemmatize_best() differs from __call__()')
+
+    return errors
+
+
+def check_table_changes():
+    lemmatizer = create_lemmatizer()
+    errors = 0
+    before = lemmatizer('tuli', 'NOUN')
+
+    # Replacing a table is detected
+    exceptions = dict(lemmatizer.lookups.get_table('lemma_exc').items())
+    lemmatizer.lookups.remove_table('lemma_exc')
+    table = lemmatizer.lookups.add_table('lemma_exc', exceptions)
+    table['noun'] = {'tuli': ['foo']}
+    if lemmatizer('tuli', 'NOUN')[0] != 'foo':
+        errors += 1
+        print(f'Replaced lemma_exc table not used: {before}')
+
+    # Editing a table in place requires clear_cache()
+    table['noun']['tuli'] = ['bar']
+    lemmatizer.clear_cache()
+    if lemmatizer('tuli', 'NOUN')[0] != 'bar' or \
+       lemmatizer.lemmatize_best('tuli', 'NOUN') != 'bar':
+        errors += 1
+        print('Edited lemma_exc table not used after clear_cache()')
+
+    lemmatizer.lookups.remove_table('lemma_exc')
+    if lemmatizer('tuli', 'NOUN') != before:
+        errors += 1
+        print('Removed lemma_exc table still used')
+    return errors
+
+
+def check_shapes():
+    cases = {
+        'number': ['2019', '-3,5', '1 000', '12.30', '50%'],
+        'url': ['https://example.fi/a?b=c', 'www.yle.fi'],
+        'email': ['etu.suku@example.fi'],
+        'hashtag': ['#vaalit2019', '@yle'],
+        'emoji': ['😀', '👍🏽', '❤️'],
+        'acronym': ['EU', 'YK', 'HS2'],
+        'long': ['a' * 65, 'ab-' + 'c' * 65],
+        None: ['2019:ssä', '2-3', 'talossa', 'a' * 64, 'a' * 70 + '-talossa',
+               'https:', 'etu@suku', '#', 'EUROOPPA'],
+    }
+
+    errors = 0
+    shapes = ShapeClassifier(ShapeClassifier.default_classes + ('acronym',))
+    for shape, strings in cases.items():
+        for string in strings:
+            if shapes(string) != shape:
+                errors += 1
+                print(f'ShapeClassifier({string!r}): {shapes(string)} != {shape}')
+    expected = {shape: len(strings) for shape, strings in cases.items() if shape}
+    if shapes.counts != expected:
+        errors += 1
+        print(f'ShapeClassifier counts: {shapes.counts}')
+
+    shapes = ShapeClassifier()
+    if shapes('EU') is not None or ShapeClassifier(max_length=3)('abcd') != 'long':
+        errors += 1
+        print('ShapeClassifier defaults not applied')
+    return errors
+
+
+def check_suffix_rules():
+    rules = [['a', ''], ['ssa', ''], ['issa', 'e'], ['', 'nen'], ['xyzzy', '']]
+    index = ['xyzzyi']
+
+    errors = 0
+    observed = SuffixRules(rules, index)('xyzzyissa')
+    # Known lemmas first, then the guesses from the longest suffix match to
+    # the empty suffix
+    expected = (['xyzzyi'], ['xyzzye', 'xyzzyiss', 'xyzzyissanen'])
+    if observed != expected:
+        errors += 1
+        print(f'SuffixRules: {observed} != {expected}')
+    observed = SuffixRules(rules)('xyzzy')
+    if observed != ([], ['xyzzynen']):
+        errors += 1
+        print(f'SuffixRules without an index: {observed}')
+
+    lookups = Lookups()
+    lookups.add_table('lemma_rules', {'noun': rules})
+    lookups.add_table('lemma_index', {'noun': index})
+    for tiers in [None, ['cache', 'rules']]:
+        lemmatizer = FinnishLemmatizer(lookups, tiers=tiers)
+        uncached = FinnishLemmatizer(lookups, tiers=tiers, result_cache_size=0)
+        for word in ['xyzzyissa', 'xyzzyssa', 'talo-xyzzyissa', 'xyzzy']:
+            lemmas = lemmatizer(word, 'NOUN')
+            if uncached.lemmatize_best(word, 'NOUN') != lemmas[0]:
+                errors += 1
+                print(f'lemmatize_best() differs from __call__() with rules: '
+                      f'{word} {lemmas}')
+        lemmas = lemmatizer('xyzzyissa', 'NOUN')
+        if lemmas != ('xyzzyi', 'xyzzye', 'xyzzyiss', 'xyzzyissanen'):
+            errors += 1
+            print(f'Suffix rules in the {tiers} tiers: {lemmas}')
+    return errors
+
+
+def check_lemma_table():
+    entries = {
+        ('kuu', 'noun'): ('kuu',),
+        ('kuusi', 'noun'): ('kuusi',),
+        ('kuusi', 'num'): ('kuusi',),
+        ('kuusia', 'noun'): ('kuusi',),
+        ('kuusien', 'noun'): ('kuusi', 'kuusia'),
+        ('öisin', 'adv'): ('öisin', 'yö'),
+        ('', 'noun'): ('',),
+    }
+    missing = [('kuu', 'num'), ('kuus', 'noun'), ('kuusix', 'noun'), ('ö', 'adv')]
+
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'lemmas.bin')
+        LemmaTable.write(path, [], flags=3)
+        table = LemmaTable(path)
+        if len(table) != 0 or table.flags != 3 or table.get('kuu', 'noun') is not None:
+            errors += 1
+            print('Empty LemmaTable round trip failed')
+        table.close()
+
+        LemmaTable.write(path, entries.items())
+        table = LemmaTable(path)
+        observed = {key: table.get(*key) for key in entries}
+        if len(table) != len(entries) or observed != entries:
+            errors += 1
+            print(f'LemmaTable round trip failed: {observed}')
+        if any(table.get(*key, default=()) != () for key in missing):
+            errors += 1
+            print('LemmaTable found a missing key')
+        if table.get('kuusi', 'noun') is not table.get('kuusia', 'noun'):
+            errors += 1
+            print('LemmaTable did not share an identical lemma list')
+        table.close()
+
+        with open(path, 'r+b') as f:
+            f.write(b'FILEMMA1')
+        try:
+            LemmaTable(path)
+            errors += 1
+            print('LemmaTable opened a file of another version')
+        except ValueError:
+            pass
+    return errors
+
+
+def check_exception_store():
+    exceptions = {
+        'noun': {'Tuli': ['foo', 'bar'], 'talossa': ['talonen']},
+        'verb': {'tuli': ['tulla', 'tuulla']},
+    }
+    words = [('tuli', 'NOUN'), ('TULI', 'NOUN'), ('talossa', 'NOUN'),
+             ('vanha-tuli', 'NOUN'), ('tuli', 'VERB'), ('talossa', 'VERB')]
+
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        json_path = os.path.join(tmpdir, 'exc.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(exceptions, f)
+
+        best = {}
+        for authoritative in [False, True]:
+            path = os.path.join(tmpdir, f'exc{authoritative}.bin')
+            ExceptionStore.from_json(json_path, path, authoritative)
+            store = ExceptionStore(path)
+            if store.authoritative != authoritative or \
+               store.get('TuLi', 'noun') is None:
+                errors += 1
+                print(f'ExceptionStore keys not lowercased: {authoritative}')
+
+            lemmatizer = create_lemmatizer(exception_store=path)
+            uncached = create_lemmatizer(exception_store=path, result_cache_size=0)
+            fast = create_lemmatizer(exception_store=path,
+                                     tiers=['exceptions', 'voikko'])
+            for word, pos in words:
+                lemma = lemmatizer(word, pos)[0]
+                best.setdefault((word, pos), set()).add(lemma)
+                if uncached.lemmatize_best(word, pos) != lemma or \
+                   fast(word, pos)[0] != lemma:
+                    errors += 1
+                    print(f'ExceptionStore order differs: {word} ({pos}), '
+                          f'authoritative={authoritative}')
+
+        if best[('tuli', 'NOUN')] != {'bar'}:
+            errors += 1
+            print(f'Authoritative and merged stores differ: {best}')
+
+        path = os.path.join(tmpdir, 'old.bin')
+        LemmaTable.write(path, [(('tuli', 'noun'), ['foo', 'bar'])],
+                         ExceptionStore.AUTHORITATIVE)
+        try:
+            ExceptionStore(path)
+            errors += 1
+            print('ExceptionStore opened an authoritative store of the old format')
+        except ValueError:
+            pass
+    return errors
+
+
+def check_fst_record(n=200000, seed=0):
+    # The regexes that FstRecord replaced
+    ny_re = re.compile(r'\[X\]\[\w+\]\[Ny\](\w+)')
+    minen_re = re.compile(r'\b(\w+)\[Tn4\]mi')
+    sti_re = re.compile(r'\b(\w+)\[Ssti\]sti')
+    pieces = ['[X]', '[Ny]', '[Tn4]', '[Ssti]', '[Lt]', '[Xp]', '[Sn]', '[]',
+              '[Bc]', 'aja', 'mi', 'sti', 'nen', 'ä', '-', ' ', '=', '(', 'a']
+    rng = random.Random(seed)
+
+    errors = 0
+    for _ in range(n):
+        fstoutput = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12)))
+        record = FstRecord(fstoutput, '')
+        observed = (record.ny_stem, record.stem('Tn4', 'mi'),
+                    record.stem('Ssti', 'sti'))
+        expected = tuple(m.group(1) if m else None for m in (
+            ny_re.search(fstoutput), minen_re.search(fstoutput),
+            sti_re.search(fstoutput)))
+        if observed != expected:
+            errors += 1
+            print(f'FstRecord({fstoutput!r}): {observed} != {expected}')
+    return errors
+
+
+def check_server(cases):
+    pairs = [(word, pos) for pos, words in cases.items() for word, _ in words]
+    expected = create_lemmatizer().lemmatize_many(pairs)
+
+    errors = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = LemmatizerServer(os.path.join(tmpdir, 'fi.sock'), n_workers=2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with LemmatizerClient(server.server_address) as client:
+                if [client(word, pos) for word, pos in pairs] != expected:
+                    errors += 1
+                    print('LemmatizerClient() differs from __call__()')
+                try:
+                    client.lemmatize_many([(1, 'NOUN')])
+                    errors += 1
+                    print('LemmatizerClient accepted a malformed pair')
+                except RuntimeError:
+                    pass
+                if client.lemmatize_many(pairs) != expected:
+                    errors += 1
+                    print('LemmatizerClient.lemmatize_many() differs from '
+                          'lemmatize_many()')
+
+            # A live server's socket and other files are not replaced
+            taken = os.path.join(tmpdir, 'file.txt')
+            with open(taken, 'w') as f:
+                f.write('data')
+            for path in [server.server_address, taken]:
+                try:
+                    LemmatizerServer(path, create_lemmatizer()).server_close()
+                    errors += 1
+                    print(f'LemmatizerServer replaced {path}')
+                except OSError:
+                    pass
+            if not os.path.exists(taken):
+                errors += 1
+                print('LemmatizerServer deleted a regular file')
+
+            server.max_message_size = 1000
+            with LemmatizerClient(server.server_address) as client:
+                try:
+                    client.lemmatize_many(pairs)
+                    errors += 1
+                    print('LemmatizerServer accepted an oversized message')
+                except (RuntimeError, ConnectionError):
+                    pass
+            with LemmatizerClient(server.server_address) as client:
+                if client(*pairs[0]) != expected[0]:
+                    errors += 1
+                    print('LemmatizerServer stopped after an oversized message')
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+    return errors
+
+
+class RecordingLemmatizer(object):
+    def __init__(self, lemmatizer, error=None):
+        self.lemmatizer = lemmatizer
+        self.error = error
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def lemmatize_many(self, pairs):
+        self.batches.append(list(pairs))
+        self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.lemmatizer.lemmatize_many(pairs)
+
+
+async def check_async_cases(pairs, expected):
+    errors = 0
+    lemmatizer = create_lemmatizer()
+    alemmatizer = AsyncLemmatizer(lemmatizer, n_threads=2)
+    results = await asyncio.gather(*[alemmatizer.alemmatize(*x) for x in pairs])
+    if results != expected:
+        errors += 1
+        print('alemmatize() differs from __call__()')
+    await alemmatizer.close()
+
+    # A caller cancelled before the flush is left out of its batch
+    recording = RecordingLemmatizer(lemmatizer)
+    alemmatizer = AsyncLemmatizer(recording, n_threads=1, max_delay=0.05)
+    tasks = [asyncio.ensure_future(alemmatizer.alemmatize(*x)) for x in pairs[:3]]
+    await asyncio.sleep(0.01)
+    tasks[1].cancel()
+    done = await asyncio.gather(*tasks, return_exceptions=True)
+    if not isinstance(done[1], asyncio.CancelledError) or \
+       [done[0], done[2]] != [expected[0], expected[2]] or \
+       recording.batches != [[pairs[0], pairs[2]]]:
+        errors += 1
+        print(f'Cancelled alemmatize() call not dropped: {recording.batches}')
+    await alemmatizer.close()
+
+    # An error reaches every caller of the batch
+    recording = RecordingLemmatizer(lemmatizer, error=KeyError('broken'))
+    alemmatizer = AsyncLemmatizer(recording, n_threads=1)
+    done = await asyncio.gather(*[alemmatizer.alemmatize(*x) for x in pairs[:3]],
+                                return_exceptions=True)
+    if not all(isinstance(x, KeyError) for x in done):
+        errors += 1
+        print(f'lemmatize_many() error not passed on: {done}')
+    await alemmatizer.close()
+
+    # Callers beyond max_pending wait for a slot
+    recording = RecordingLemmatizer(lemmatizer)
+    recording.release.clear()
+    alemmatizer = AsyncLemmatizer(recording, n_threads=4, max_batch_size=1,
+                                  max_pending=2)
+    tasks = [asyncio.ensure_future(alemmatizer.alemmatize(*x)) for x in pairs[:3]]
+    await asyncio.sleep(0.05)
+    if len(recording.batches) != 2:
+        errors += 1
+        print(f'max_pending not enforced: {recording.batches}')
+    recording.release.set()
+    if await asyncio.gather(*tasks) != expected[:3]:
+        errors += 1
+        print('alemmatize() differs from __call__() with max_pending')
+    await alemmatizer.close()
+
+    try:
+        await asyncio.wait_for(alemmatizer.alemmatize(*pairs[0]), 1)
+        errors += 1
+        print('alemmatize() accepted a call after close()')
+    except RuntimeError:
+        pass
+    return errors
+
+
+def check_async(cases):
+    pairs = [(word, pos) for pos, words in cases.items() for word, _ in words]
+    expected = create_lemmatizer().lemmatize_many(pairs)
+    return asyncio.run(check_async_cases(pairs, expected))
+
+
+def check_columnar():
+    lemmatizer = create_lemmatizer()
+    forms = numpy.array(['talossa', None, 'talossa', float('nan')], dtype=object)
+    expected = lemmatizer.lemmatize_best('talossa', 'NOUN')
+
+    errors = 0
+    for upos in ['NOUN', numpy.array(['NOUN', 'NOUN', 'NOUN', None], dtype=object)]:
+        lemmas = lemmatize_array(lemmatizer, forms, upos).tolist()
+        if lemmas != [expected, None, expected, None]:
+            errors += 1
+            print(f'lemmatize_array() with missing values: {lemmas}')
+    return errors
+
+
+@register_tier
+class BrandTier(Tier):
+    name = 'brand'
+
+    def lookup(self, lemmatizer, string, univ_pos, tables):
+        return ('Voikko',) if string.lower() == 'voikolla' else None
+
+
+def check_tiers():
+    lemmatizer = create_lemmatizer(tiers=['cache', BrandTier(), 'voikko'])
+    restored = [
+        pickle.loads(pickle.dumps(lemmatizer)),
+        create_lemmatizer().from_bytes(lemmatizer.to_bytes()),
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        lemmatizer.to_disk(tmpdir)
+        restored.append(create_lemmatizer().from_disk(tmpdir))
+
+    errors = 0
+    for other in restored:
+        if other.tiers.names != ['cache', 'brand', 'voikko'] or \
+           other('voikolla', 'NOUN') != ('Voikko',):
+            errors += 1
+            print(f'Tiers not restored: {other.tiers.names}')
+
+    lemmatizer = create_lemmatizer(tiers=['cache', 'rules', 'exceptions'])
+    for word in ['talo', 'tuli', 'voikolla']:
+        if lemmatizer.lemmatize_best(word, 'VERB') != lemmatizer(word, 'VERB')[0]:
+            errors += 1
+            print(f'lemmatize_best() ignores the tiers: {word}')
+    return errors
+
+
 testcases = {
     'noun': [
         ('tila', ['tila']),
@@ -364,3 +811,36 @@ failed_prop = check(testcases)
 
 if failed_prop > 0:
     print(f'Failed: {failed_prop*100:.1f} % ')
+
+if check_batch(testcases) > 0:
+    print('Failed: batch lemmatization')
+
+if check_table_changes() > 0:
+    print('Failed: lemma table changes')
+
+if check_shapes() > 0:
+    print('Failed: token shapes')
+
+if check_suffix_rules() > 0:
+    print('Failed: suffix rules')
+
+if check_lemma_table() > 0:
+    print('Failed: lemma table files')
+
+if check_exception_store() > 0:
+    print('Failed: exception stores')
+
+if check_fst_record() > 0:
+    print('Failed: FSTOUTPUT parsing')
+
+if check_server(testcases) > 0:
+    print('Failed: lemmatizer server')
+
+if check_async(testcases) > 0:
+    print('Failed: asyncio lemmatization')
+
+if check_columnar() > 0:
+    print('Failed: columnar lemmatization')
+
+if check_tiers() > 0:
+    print('Failed: tier serialization')